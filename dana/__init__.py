@@ -53,6 +53,10 @@ from functions import convolve1d, convolve2d
 from functions import zeros, ones, empty
 from functions import zeros_like, ones_like, empty_like
 from csr_array import csr_array, dot
+from connectivity import fixed_probability, fixed_indegree
+from connectivity import fixed_outdegree, distance_probability
+from connectivity import distance_weights
+from parallel import set_num_threads, get_num_threads
 
 from clock import Clock, before, after, second, millisecond
 
@@ -63,6 +67,12 @@ from connection        import Connection, ConnectionError
 from dense_connection  import DenseConnection
 from sparse_connection import SparseConnection
 from shared_connection import SharedConnection
+from lowrank_connection import LowRankConnection
+from stencil_connection import StencilConnection
+from sigmapi_connection import SigmaPiConnection
+from pooling_connection import PoolingConnection
+from reduction_connection import ReductionConnection
+from autotune          import select_engine
 
 from model         import Model, ModelError
 from definition    import Definition, DefinitionError
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+Automatic connection engine selection
+
+The fastest way to propagate activity between two groups depends on group
+sizes, kernel size, kernel sparsity and kernel separability. This module
+estimates the cost of each available engine from these properties (and can
+optionally time a few propagations) in order to pick the fastest one. Once
+taken, a decision is remembered for any connection sharing the same shape
+signature.
+
+**Examples**
+
+>>> src = np.ones((50,50))
+>>> C = Connection(src, src, np.ones((5,5)), engine='auto')
+"""
+import time
+import numpy as np
+import scipy.linalg
+import scipy.sparse as sparse
+from functions import extract, best_fft_shape
+from connection import ConnectionError
+from dense_connection import DenseConnection
+from sparse_connection import SparseConnection
+from shared_connection import SharedConnection
+from stencil_connection import StencilConnection
+
+
+# Decisions taken so far, indexed by connection signature (and whether they
+# were timed)
+_decisions = {}
+
+
+def _dense(source, target, weights, equation, toric):
+    return DenseConnection(source, target, weights, equation, toric)
+
+def _sparse(source, target, weights, equation, toric):
+    return SparseConnection(source, target, weights, equation, toric)
+
+def _fft(source, target, weights, equation, toric):
+    if equation:
+        raise ConnectionError, 'Shared connection cannot learn'
+    return SharedConnection(source, target, weights, toric, fft=True)
+
+def _svd(source, target, weights, equation, toric):
+    if equation:
+        raise ConnectionError, 'Shared connection cannot learn'
+    return SharedConnection(source, target, weights, toric, fft=False)
+
+def _stencil(source, target, weights, equation, toric):
+    if equation:
+        raise ConnectionError, 'Stencil connection cannot learn'
+    return StencilConnection(source, target, weights, toric)
+
+engines = { 'dense'   : _dense,
+            'sparse'  : _sparse,
+            'fft'     : _fft,
+            'svd'     : _svd,
+            'stencil' : _stencil }
+
+
+def _properties(source, target, weights, equation, toric):
+    """ Return (signature, costs) for the given connection description. """
+
+    src_shape = np.array(source.shape)
+    N, M = int(np.prod(src_shape)), int(np.prod(target.shape))
+
+    # Full connection matrix: only dense and sparse engines are possible
+    if sparse.issparse(weights) or weights.shape == (M,N):
+        if sparse.issparse(weights):
+            nnz = weights.nnz
+        else:
+            nnz = int((np.nan_to_num(weights) != 0).sum())
+        signature = ('matrix', tuple(source.shape), tuple(target.shape),
+                     sparse.issparse(weights), nnz, bool(equation))
+        costs = { 'dense'  : float(M)*N,
+                  'sparse' : 3.0*nnz }
+        return signature, costs
+
+    if len(weights.shape) != len(source.shape):
+        raise ConnectionError, \
+            'Weights matrix shape is wrong relative to source and target'
+    if toric:
+        w = np.array(weights.shape)
+        weights = extract(weights, np.minimum(src_shape,w), w//2)
+    wgt_shape = np.array(weights.shape)
+    K = np.nan_to_num(weights)
+    k = int((1-np.isnan(weights)).sum())
+    rank = 1
+    if len(weights.shape) == 2 and weights.size > 1:
+        S = scipy.linalg.svd(K, compute_uv=False)
+        rank = int((S > 1e-12).sum())
+    signature = ('kernel', tuple(source.shape), tuple(target.shape),
+                 tuple(weights.shape), k, rank, bool(toric), bool(equation))
+
+    costs = { 'dense'  : float(M)*N,
+              'sparse' : 3.0*M*k }
+
+    # Shared connections cannot learn
+    if not equation and len(source.shape) == len(target.shape):
+        if toric:
+            F = float(np.prod(src_shape))
+        else:
+            F = float(np.prod(best_fft_shape(src_shape + wgt_shape//2)))
+        costs['fft'] = 5.0*F*np.log2(max(F,2)) + 2.0*F
+        if len(source.shape) == 2:
+            costs['svd'] = 2.0*rank*N*wgt_shape.sum() + 2.0*N*rank
+        else:
+            costs['svd'] = 2.0*N*wgt_shape.prod()
+        if tuple(source.shape) == tuple(target.shape) \
+               and wgt_shape.max() <= StencilConnection.max_size:
+            # Each shifted slice has a fixed (python) overhead
+            pieces = k*2**len(wgt_shape) if toric else k
+            costs['stencil'] = 2.5*N*k + 8000.0*pieces
+    return signature, costs
+
+
+def _measure(source, target, weights, equation, toric, engine, n=5):
+    """ Time n propagations of a connection using the given engine. """
+
+    C = engines[engine](source, target, weights, equation, toric)
+    connections = getattr(C._target, '_connections', [])
+    if C in connections:
+        connections.remove(C)
+    C.output()
+    t0 = time.time()
+    for i in range(n):
+        C.output()
+    return (time.time()-t0)/n
+
+
+def select_engine(source, target, weights, equation='', toric=False,
+                  timing=False):
+    """
+    Select the fastest engine for a connection.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    weights : array
+        Kernel or full connection matrix
+    equation : str
+        Weights update equation (shared engines are discarded if given)
+    toric : bool
+        Whether connection is toric
+    timing : bool
+        Whether to time a few propagations of the best estimated engines
+        instead of relying on cost estimation only
+
+    **Returns**
+
+    One of ``'dense'``, ``'sparse'``, ``'fft'``, ``'svd'`` or ``'stencil'``.
+    """
+
+    if type(weights) in [int,float]:
+        weights = np.ones((1,)*len(source.shape))*weights
+    signature, costs = _properties(source, target, weights, equation, toric)
+    signature = signature + (bool(timing),)
+    if signature in _decisions:
+        return _decisions[signature]
+    candidates = sorted(costs.keys(), key=lambda engine: costs[engine])
+    engine = candidates[0]
+    if timing and len(candidates) > 1:
+        # Only time engines whose estimated cost is close to the best one
+        candidates = [c for c in candidates if costs[c] < 10*costs[engine]]
+        times = [_measure(source, target, weights, equation, toric, c)
+                 for c in candidates]
+        engine = candidates[int(np.argmin(times))]
+    _decisions[signature] = engine
+    return engine
+
+
+def connect(source, target, weights, equation='', toric=False,
+            engine='auto', timing=False):
+    """
+    Build a connection using the given engine or the fastest one.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    weights : array
+        Kernel or full connection matrix
+    equation : str
+        Weights update equation
+    toric : bool
+        Whether connection is toric
+    engine : str
+        One of ``'auto'``, ``'dense'``, ``'sparse'``, ``'fft'``, ``'svd'`` or
+        ``'stencil'``
+    timing : bool
+        Whether automatic selection times actual propagations
+    """
+
+    if engine == 'auto':
+        engine = select_engine(source, target, weights, equation,
+                               toric, timing)
+    if engine not in engines.keys():
+        raise ConnectionError, 'Unknown connection engine (%s)' % engine
+    return engines[engine](source, target, weights, equation, toric)
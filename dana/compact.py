@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+Reduced precision storage for connection weights
+
+A CompactArray stores a dense or sparse (CSR) weights matrix using either
+float16 values or int8 values with a per-row scale. Values are decompressed on
+the fly, one block of rows at a time, such that memory never holds more than a
+bounded number of full precision values. When weights are updated, they can be
+stored back using stochastic rounding such that small updates are not lost on
+average.
+
+**Examples**
+
+>>> W = CompactArray(np.random.random((100,100)), 'int8')
+>>> R = W.dot(np.ones(100))
+"""
+import numpy as np
+import scipy.sparse as sparse
+from csr_array import csr_array, csr_matvec
+
+# Maximum number of full precision values decompressed at once
+block_size = 2**16
+
+
+class CompactArray(object):
+    """ Dense or sparse 2d array stored with reduced precision """
+
+    def __init__(self, W, storage='float16'):
+        """
+        Compress W using given storage.
+
+        **Parameters**
+
+        W : array or sparse matrix
+            Full precision 2d array
+        storage : str
+            Either 'float16' or 'int8' (with per-row scale)
+        """
+
+        if storage not in ['float16', 'int8']:
+            raise ValueError, 'Unknown storage (%s)' % storage
+        self.storage = storage
+        self.shape = W.shape
+        self.issparse = sparse.issparse(W)
+        M, N = W.shape
+        if self.issparse:
+            W = W.tocsr()
+            self.indptr, self.indices = W.indptr, W.indices
+            values = np.nan_to_num(W.data)
+        else:
+            values = np.nan_to_num(np.asarray(W))
+        if storage == 'float16':
+            self.data = np.empty(values.shape, dtype=np.float16)
+            self.scale = None
+        else:
+            self.data = np.empty(values.shape, dtype=np.int8)
+            self.scale = np.ones(M)
+        for rows in self.blocks():
+            self.store(rows, self._values(values, rows))
+
+
+    def blocks(self):
+        """ Return slices of rows holding at most block_size values each """
+
+        M, N = self.shape
+        if not self.issparse:
+            n = max(1, block_size//max(N,1))
+            return [slice(i,min(i+n,M)) for i in range(0,M,n)]
+        bounds = np.searchsorted(self.indptr,
+                                 np.arange(0, self.indptr[-1], block_size))
+        bounds = np.unique(np.concatenate([[0], bounds, [M]]))
+        return [slice(bounds[i],bounds[i+1]) for i in range(len(bounds)-1)]
+
+
+    def _positions(self, rows):
+        """ Return data slice corresponding to rows """
+
+        if self.issparse:
+            return slice(self.indptr[rows.start], self.indptr[rows.stop])
+        return rows
+
+
+    def _values(self, values, rows):
+        """ Extract values corresponding to rows """
+        return values[self._positions(rows)]
+
+
+    def _row_scale(self, rows):
+        """ Return scale for each value of rows """
+
+        scale = self.scale[rows]
+        if self.issparse:
+            return np.repeat(scale, np.diff(self.indptr[rows.start:rows.stop+1]))
+        return scale.reshape((-1,1))
+
+
+    def load(self, rows):
+        """ Return full precision values of given rows (slice) """
+
+        data = self.data[self._positions(rows)].astype(float)
+        if self.scale is not None:
+            data *= self._row_scale(rows)
+        return data
+
+
+    def store(self, rows, values, stochastic=False):
+        """
+        Store full precision values of given rows (slice), possibly using
+        stochastic rounding.
+        """
+
+        positions = self._positions(rows)
+        if self.storage == 'float16':
+            Z = values.astype(np.float16)
+            if stochastic:
+                lo = np.where(Z.astype(float) > values,
+                              np.nextafter(Z, np.float16(-np.inf)), Z)
+                hi = np.nextafter(lo, np.float16(np.inf))
+                span = hi.astype(float) - lo.astype(float)
+                p = np.where(span > 0, (values - lo)/np.where(span > 0, span, 1), 0)
+                Z = np.where(np.random.random(values.shape) < p, hi, lo)
+            self.data[positions] = Z
+            return
+
+        # Per-row scale
+        A = np.abs(values)
+        if self.issparse:
+            sizes = np.diff(self.indptr[rows.start:rows.stop+1])
+            starts = np.cumsum(sizes) - sizes
+            vmax = np.zeros(len(sizes))
+            nz = sizes > 0
+            vmax[nz] = np.maximum.reduceat(A, starts[nz]) if A.size else 0
+        else:
+            vmax = A.max(1) if A.size else np.zeros(0)
+        self.scale[rows] = np.where(vmax > 0, vmax/127.0, 1.0)
+        Z = values / self._row_scale(rows)
+        if stochastic:
+            Z = np.floor(Z + np.random.random(Z.shape))
+        else:
+            Z = np.rint(Z)
+        self.data[positions] = np.clip(Z, -127, 127)
+
+
+    def dot(self, x):
+        """ Matrix/vector product using full precision blocks """
+
+        M, N = self.shape
+        R = np.zeros(M)
+        x = np.asarray(x, dtype=float)
+        for rows in self.blocks():
+            values = self.load(rows)
+            if self.issparse:
+                indptr = self.indptr[rows.start:rows.stop+1]
+                positions = self._positions(rows)
+                csr_matvec(rows.stop-rows.start, N, indptr-indptr[0],
+                           self.indices[positions], values, x, R[rows])
+            else:
+                R[rows] = np.dot(values, x)
+        return R
+
+
+    def columns(self, index):
+        """ Return full precision columns (dense storage only) """
+
+        data = self.data[:,index].astype(float)
+        if self.scale is not None:
+            data *= self.scale.reshape((-1,1))
+        return data
+
+
+    def toarray(self):
+        """ Return full precision weights (dense array or csr_array) """
+
+        if self.issparse:
+            data = np.concatenate([self.load(rows) for rows in self.blocks()]
+                                  or [np.zeros(0)])
+            return csr_array((data, self.indices.copy(), self.indptr.copy()),
+                             shape=self.shape)
+        return np.concatenate([self.load(rows) for rows in self.blocks()]
+                              or [np.zeros(self.shape)])
+
+
+    nbytes = property(lambda self: self.data.nbytes +
+                      (self.scale.nbytes if self.scale is not None else 0) +
+                      (self.indptr.nbytes + self.indices.nbytes if self.issparse else 0),
+        doc='''Number of bytes used by storage.''')
@@ -34,7 +34,14 @@
 import re
 import inspect
 from diff_equation import DifferentialEquation
+from delay import history
 import numpy as np
+import scipy.sparse as sparse
+try:
+    from scipy.sparse._sparsetools import csr_matvec
+except ImportError:
+    from scipy.sparse.sparsetools import csr_matvec
+from csr_array import take_rows, take_columns
 
 
 class ConnectionError(Exception):
@@ -42,6 +49,22 @@ class ConnectionError(Exception):
     pass
 
 
+class _ConnectionType(type):
+    """
+    Connection metaclass that turns ``Connection(source, target, weights)``
+    into a factory picking the actual connection engine (see
+    :func:`dana.autotune.connect`).
+    """
+
+    def __call__(cls, *args, **kwargs):
+        if cls is Connection and ('weights' in kwargs or 'engine' in kwargs
+               or (len(args) > 2 and
+                   not isinstance(args[2], (bool, int, long, np.integer)))):
+            from autotune import connect
+            return connect(*args, **kwargs)
+        return type.__call__(cls, *args, **kwargs)
+
+
 class Connection(object):
     """
     A connection describes a flow of information between two groups (that can
@@ -66,8 +89,19 @@ class Connection(object):
     In the above example, a connection has been created between ``src`` and
     ``tgt``. The state variable holding the result in ``tgt`` is named ``U``
     and the output of the connection is computed by mutliplying src by ``K``.
+
+    When weights are given, ``Connection`` acts as a factory and returns a
+    dense, sparse or shared connection depending on the ``engine`` argument
+    (``'auto'`` by default, see :func:`dana.autotune.select_engine`)::
+
+      >>> C = Connection(src, tgt('U'), np.ones((3,3)), engine='auto')
     """
 
+    __metaclass__ = _ConnectionType
+
+    # Maximum proportion of active source units for event-driven propagation
+    event_threshold = 0.05
+
     def __init__(self, source, target, toric=False):
 
         """
@@ -85,6 +119,10 @@ class Connection(object):
         self._weights = None
         self._equation = None
         self._toric = toric
+        self._events = None
+        self._delays = 0
+        self._history = None
+        self._buckets = None
 
         # Get actual source
         names = source.dtype.names
@@ -124,6 +162,242 @@ class Connection(object):
         """ Setup weights if necessary """
         pass
 
+    def setup_shared(self, weights, engine):
+        """
+        Back connection by a shared (FFT or stencil) connection if weights is
+        a kernel and if this is estimated to be cheaper than using the given
+        engine (``'dense'`` or ``'sparse'``). Connections that learn cannot be
+        backed by a shared connection.
+
+        **Returns**
+
+        True if connection is backed by a shared connection.
+        """
+
+        from autotune import _properties
+        from shared_connection import SharedConnection
+        from stencil_connection import StencilConnection
+
+        self._shared = None
+        if type(weights) in [int,float]:
+            weights = np.ones((1,)*len(self.source.shape))*weights
+        if not isinstance(weights, np.ndarray) \
+               or weights.shape == (self.target.size, self.source.size) \
+               or len(weights.shape) != len(self.source.shape) \
+               or len(self.source.shape) != len(self.target.shape):
+            return False
+        signature, costs = _properties(self.source, self.target, weights,
+                                       '', self._toric)
+        shared = min(['fft','stencil'], key=lambda e: costs.get(e,np.inf))
+        if costs[shared] >= costs[engine]:
+            return False
+        if shared == 'stencil':
+            shared = StencilConnection(self.source, self.target, weights,
+                                       self._toric)
+        else:
+            shared = SharedConnection(self.source, self.target, weights,
+                                      self._toric, fft=True)
+        if shared in getattr(self._target, '_connections', []):
+            self._target._connections.remove(shared)
+        self._shared = shared
+        self._kernel = weights
+        return True
+
+    def setup_delays(self, delays):
+        """
+        Setup conduction delays (in time steps)
+
+        **Parameters**
+
+        delays : int or array
+            Either a single delay for all synapses or a delay for each synapse
+            given as an array (or sparse matrix) of shape (target.size,
+            source.size). Synapses sharing the same delay are grouped such
+            that propagation remains vectorized.
+        """
+
+        self._delays = 0
+        self._history = None
+        self._buckets = None
+        if delays is None:
+            return
+        if np.isscalar(delays):
+            if delays < 0:
+                raise ConnectionError, 'Delays must be positive'
+            if not delays:
+                return
+            self._delays = int(delays)
+            depth = self._delays+1
+        else:
+            if delays.shape != (self.target.size, self.source.size):
+                raise ConnectionError, \
+                    'Delays matrix shape is wrong relative to source and target'
+            rows, cols, positions = self._synapses()
+            if sparse.issparse(delays):
+                D = np.asarray(delays.tocsr()[rows,cols]).ravel()
+            else:
+                D = np.asarray(delays)[rows,cols]
+            D = D.astype(int)
+            if (D < 0).any():
+                raise ConnectionError, 'Delays must be positive'
+            self._buckets = []
+            M, N = self.target.size, self.source.size
+            for delay in np.unique(D):
+                index = np.flatnonzero(D == delay)
+                order = np.argsort(rows[index], kind='mergesort')
+                index = index[order]
+                indptr = np.zeros(M+1, dtype=np.int32)
+                indptr[1:] = np.cumsum(np.bincount(rows[index], minlength=M))
+                self._buckets.append((int(delay), indptr,
+                                      cols[index].astype(np.int32),
+                                      positions[index]))
+            self._delays = D
+            depth = D.max()+1 if D.size else 1
+        if self._source_name:
+            owner, present = self._source, self._source._data[self._source_name]
+        else:
+            owner, present = self._actual_source, self._actual_source
+        self._present = present
+        self._history = history(owner, self._source_name, present.shape, depth)
+
+    def _synapses(self):
+        """
+        Return rows, columns and positions within weights data of synapses
+        (used for per-synapse delays).
+        """
+        raise ConnectionError, \
+            'Per-synapse delays are not supported by this connection'
+
+    def _delay(self):
+        """ Record source state and make delayed state the actual source """
+
+        if self._source_name:
+            self._present = self._source._data[self._source_name]
+        self._history.record(self, self._present)
+        if self._buckets is None:
+            self._actual_source = self._history[self._delays]
+
+    def _output_delays(self, data):
+        """
+        Return output for per-synapse delays, data holding weights values
+        (indexed by synapses positions).
+        """
+
+        M, N = self.target.size, self.source.size
+        R = np.zeros(M)
+        for delay, indptr, indices, positions in self._buckets:
+            source = np.asarray(self._history[delay], dtype=float).ravel()
+            values = np.asarray(data[positions], dtype=float)
+            csr_matvec(M, N, indptr, indices, values, source, R)
+        return R.reshape(self._target.shape)
+
+    def receptive_fields(self, units=None, sparse=False):
+        """
+        Return receptive fields (weights from source to given target units)
+        of many units at once.
+
+        **Parameters**
+
+        units : None, int, array of int or array of index tuples
+            Target units (flat indices or index tuples), all if None
+        sparse : bool
+            Whether to return a sparse matrix of shape (len(units),
+            source.size) rather than an array of shape (len(units),)+
+            source.shape where unconnected source units are NaN.
+        """
+        units = self._units(units, self.target.shape)
+        return self._fields(self._receptive_fields(units),
+                            self.source.shape, sparse)
+
+    def projective_fields(self, units=None, sparse=False):
+        """
+        Return projective fields (weights from given source units to target)
+        of many units at once.
+
+        **Parameters**
+
+        units : None, int, array of int or array of index tuples
+            Source units (flat indices or index tuples), all if None
+        sparse : bool
+            Whether to return a sparse matrix of shape (len(units),
+            target.size) rather than an array of shape (len(units),)+
+            target.shape where unconnected target units are NaN.
+        """
+        units = self._units(units, self.source.shape)
+        return self._fields(self._projective_fields(units),
+                            self.target.shape, sparse)
+
+    def _units(self, units, shape):
+        """ Return flat indices of units """
+        if units is None:
+            return np.arange(int(np.prod(shape)))
+        units = np.asarray(units, dtype=int)
+        if units.ndim == 2:
+            return np.ravel_multi_index(tuple(units.T), shape)
+        return units.ravel()
+
+    def _fields(self, W, shape, sparse_):
+        """ Return fields given as a sparse matrix (NaN dense array if needed) """
+        if sparse_:
+            return W
+        Z = np.zeros(W.shape)*np.NaN
+        rows = np.repeat(np.arange(W.shape[0]), np.diff(W.indptr))
+        Z[rows, W.indices] = W.data
+        return Z.reshape((W.shape[0],)+tuple(shape))
+
+    def _matrix(self):
+        """ Return weights as a sparse matrix (structure being connectivity) """
+        W = getattr(self, 'weights', None)
+        if W is None:
+            raise ConnectionError, 'Connection has no weights'
+        if sparse.issparse(W):
+            return sparse.csr_matrix((W.data, W.indices, W.indptr), shape=W.shape)
+        W = np.asarray(W)
+        return self._valid_matrix(W, ~np.isnan(W))
+
+    def _valid_matrix(self, W, valid):
+        """ Return csr matrix of valid weights (keeping explicit zeros) """
+        rows, cols = valid.nonzero()
+        indptr = np.zeros(W.shape[0]+1, dtype=int)
+        indptr[1:] = np.cumsum(valid.sum(1))
+        return sparse.csr_matrix((np.asarray(W)[rows,cols], cols, indptr),
+                                 shape=W.shape)
+
+    def _receptive_fields(self, units):
+        """ Return receptive fields of given units as a csr matrix """
+        return take_rows(self._matrix(), units)
+
+    def _projective_fields(self, units):
+        """ Return projective fields of given units as a csr matrix """
+        return take_columns(self._matrix().tocsc(), units)
+
+    def setup_events(self, events):
+        """
+        Setup event-driven propagation
+
+        **Parameters**
+
+        events : bool or None
+            If True, source is considered to be event-like and propagation
+            only involves active (non null) source units. If None, event-driven
+            propagation is only used when the proportion of active source units
+            is below ``event_threshold``. If False, it is never used.
+        """
+        self._events = events
+
+    def active_units(self):
+        """
+        Return flat indices of active source units if propagation should be
+        event-driven, None else.
+        """
+        if self._events is False:
+            return None
+        source = self._actual_source.ravel()
+        index = np.flatnonzero(source)
+        if self._events or len(index) < self.event_threshold*source.size:
+            return index
+        return None
+
     def setup_equation(self, equation):
         """ Setup weights update equation """
 
@@ -166,6 +440,8 @@ class Connection(object):
             self._actual_source = self._source._data[self._source_name]
         if self._target_name:
             self._actual_target = self._target._data[self._target_name]
+        if self._history is not None:
+            self._delay()
         self._actual_target += self.output()
 
 
@@ -173,14 +449,18 @@ class Connection(object):
         """ Update weights relative to connection equation """
         if not self._equation:
             return
+        self._update_kwargs()
+        self._equation._in_out = self._weights
+        self._equation.evaluate(self._weights, dt, **self._kwargs)
+
+    def _update_kwargs(self):
+        """ Update equation arguments relative to source and target """
         pre, post = self._source, self._target
         for arg in self._kwargs.keys():
             if arg.startswith("pre_"):
                 self._kwargs[arg] = pre[arg[4:]].reshape((1,pre.size))
             elif arg.startswith("post_"):
                 self._kwargs[arg] = post[arg[5:]].reshape((post.size,1))
-        self._equation._in_out = self._weights
-        self._equation.evaluate(self._weights, dt, **self._kwargs)
 
     def output(self):
         """ Return output of connection """
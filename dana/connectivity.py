@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+Random connectivity generators
+
+These functions build random sparse weights matrices of shape (target.size,
+source.size) directly in CSR form (see :class:`dana.csr_array`) using O(nnz)
+memory and time, such that no dense matrix is ever needed. Weights are given
+either as a scalar or as a function returning n weights values (e.g.
+``lambda n: np.random.uniform(0,1,n)``). Resulting matrices can be given
+directly to :class:`dana.SparseConnection`.
+
+**Examples**
+
+>>> W = fixed_probability(src, tgt, 0.1, lambda n: np.random.uniform(0,1,n))
+>>> C = SparseConnection(src, tgt, W)
+"""
+import numpy as np
+import numpy.random as rnd
+from scipy.spatial import cKDTree
+from csr_array import csr_array
+
+# Maximum number of candidate connections drawn at once
+chunk_size = 2**20
+
+
+def _values(weights, n):
+    """ Return n weights values """
+    if callable(weights):
+        return np.asarray(weights(n), dtype=float).ravel()
+    return np.ones(n)*weights
+
+
+def _csr(rows, cols, values, shape):
+    """ Build csr array from row-sorted coordinates """
+    M, N = shape
+    indptr = np.zeros(M+1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=M))
+    if N <= np.iinfo(np.int32).max and len(cols) <= np.iinfo(np.int32).max:
+        indptr, cols = indptr.astype(np.int32), cols.astype(np.int32)
+    return csr_array((values, cols, indptr), shape=shape)
+
+
+def _sample(n, k, N):
+    """ Return n rows of k distinct sorted integers within [0,N) """
+    if k > N:
+        raise ValueError, 'Cannot draw %d distinct units among %d' % (k, N)
+    if 2*k > N:
+        return np.sort(np.argsort(rnd.random((n,N)), axis=1)[:,:k], axis=1)
+    C = rnd.randint(0, N, (n,k))
+    while True:
+        C.sort(axis=1)
+        duplicates = np.zeros(C.shape, dtype=bool)
+        duplicates[:,1:] = C[:,1:] == C[:,:-1]
+        if not duplicates.any():
+            return C
+        C[duplicates] = rnd.randint(0, N, duplicates.sum())
+
+
+def fixed_probability(source, target, p, weights=1.0):
+    """
+    Connect each (source, target) pair of units with probability p.
+
+    Connections are drawn by skipping geometrically distributed gaps over the
+    flattened matrix.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    p : float
+        Connection probability
+    weights : float or function
+        Weights value or function returning n weights values
+    """
+
+    M, N = target.size, source.size
+    total = M*N
+    if p <= 0 or not total:
+        positions = np.zeros(0, dtype=np.int64)
+    elif p >= 1:
+        positions = np.arange(total, dtype=np.int64)
+    else:
+        positions, last = [], -1
+        size = int(total*p*1.05) + 64
+        while True:
+            P = last + np.cumsum(rnd.geometric(p, size).astype(np.int64))
+            if P[-1] >= total:
+                positions.append(P[P < total])
+                break
+            positions.append(P)
+            last, size = P[-1], int((total-P[-1])*p*1.05) + 64
+        positions = np.concatenate(positions)
+    return _csr(positions // N, positions % N,
+                _values(weights, len(positions)), (M,N))
+
+
+def fixed_indegree(source, target, k, weights=1.0):
+    """
+    Connect each target unit to k distinct random source units.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    k : int
+        Number of connections per target unit
+    weights : float or function
+        Weights value or function returning n weights values
+    """
+
+    M, N = target.size, source.size
+    cols = _sample(M, k, N).ravel()
+    rows = np.repeat(np.arange(M), k)
+    return _csr(rows, cols, _values(weights, len(cols)), (M,N))
+
+
+def fixed_outdegree(source, target, k, weights=1.0):
+    """
+    Connect each source unit to k distinct random target units.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    k : int
+        Number of connections per source unit
+    weights : float or function
+        Weights value or function returning n weights values
+    """
+
+    M, N = target.size, source.size
+    rows = _sample(N, k, M).ravel()
+    cols = np.repeat(np.arange(N), k)
+    order = np.argsort(rows, kind='mergesort')
+    return _csr(rows[order], cols[order], _values(weights, len(cols)), (M,N))
+
+
+def distance_probability(source, target, probability, radius,
+                         weights=1.0, toric=False):
+    """
+    Connect each target unit to source units within radius with a probability
+    depending on distance. Target units are mapped onto the source grid as for
+    other connections (normalized coordinates) and distances are measured in
+    source units.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    probability : function
+        Function returning connection probability for an array of distances
+    radius : int or tuple of int
+        Maximum offset (in source units) along each dimension
+    weights : float or function
+        Weights value or function returning n weights values
+    toric : bool
+        Whether source boundaries wrap around
+    """
+
+    src, tgt = source.shape, target.shape
+    d = len(src)
+    if len(tgt) != d:
+        raise ValueError, 'Source and target must have the same number of dimensions'
+    if np.isscalar(radius):
+        radius = (radius,)*d
+    radius = np.array(radius, dtype=int)
+    if toric:
+        radius = np.minimum(radius, (np.array(src)-1)//2)
+
+    # Candidate offsets and their connection probability
+    offsets = (np.indices(2*radius+1).reshape((d,-1)) - radius.reshape((-1,1)))
+    p = np.asarray(probability(np.sqrt((offsets**2).sum(0))), dtype=float)
+    p = p*np.ones(offsets.shape[1])
+    keep = p > 0
+    offsets, p = offsets[:,keep], p[keep]
+
+    # Source unit corresponding to each target unit
+    centers = [np.rint(np.linspace(0,1,tgt[i])*(src[i]-1)).astype(int)
+               for i in range(d)]
+    M, N = target.size, source.size
+    B = max(offsets.shape[1], 1)
+    step = max(1, chunk_size//B)
+    rows, cols = [], []
+    for start in range(0, M, step):
+        units = np.arange(start, min(start+step, M))
+        index = np.unravel_index(units, tgt)
+        S = np.array([centers[i][index[i]] for i in range(d)]).reshape((d,-1,1)) \
+            + offsets.reshape((d,1,-1))
+        hit = rnd.random((len(units), offsets.shape[1])) < p
+        if toric:
+            S %= np.array(src).reshape((d,1,1))
+        else:
+            hit &= ((S >= 0) & (S < np.array(src).reshape((d,1,1)))).all(0)
+        r, b = hit.nonzero()
+        rows.append(units[r])
+        cols.append(np.ravel_multi_index(tuple(S[:,r,b]), src))
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=int)
+    order = np.lexsort((cols, rows))
+    return _csr(rows[order], cols[order], _values(weights, len(cols)), (M,N))
+
+
+def positions(group):
+    """
+    Return units positions of group (shape (size, ndim)). Units of groups
+    without explicit positions lie on a regular grid in normalized
+    coordinates (within [0,1] along each dimension).
+    """
+
+    P = getattr(group, 'positions', None)
+    if P is not None:
+        return np.asarray(P, dtype=float).reshape((group.size,-1))
+    shape = group.shape
+    scale = np.array([max(n-1,1) for n in shape], dtype=float)
+    return np.indices(shape).reshape((len(shape),-1)).T/scale
+
+
+def distance_weights(source, target, kernel, radius=None, k=None):
+    """
+    Connect each target unit to source units within radius (or to its k
+    nearest source units) using a KD-tree over units positions (see
+    :func:`positions`), weights being given by a kernel of distances.
+
+    **Parameters**
+
+    source : Group
+        Source group
+    target : Group
+        Target group
+    kernel : function
+        Function returning weights for an array of distances
+    radius : float
+        Maximum distance between connected units
+    k : int
+        Number of nearest source units to connect to
+    """
+
+    if (radius is None) == (k is None):
+        raise ValueError, 'Exactly one of radius and k must be given'
+    src, tgt = positions(source), positions(target)
+    if src.shape[1] != tgt.shape[1]:
+        raise ValueError, 'Source and target positions dimensions differ'
+    M, N = len(tgt), len(src)
+    tree = cKDTree(src)
+    if radius is not None:
+        pairs = cKDTree(tgt).sparse_distance_matrix(tree, radius,
+                                                    output_type='ndarray')
+        rows, cols, distances = pairs['i'], pairs['j'], pairs['v']
+    else:
+        k = min(k, N)
+        distances, cols = tree.query(tgt, k)
+        distances = distances.reshape((M,k)).ravel()
+        cols = cols.reshape((M,k)).ravel()
+        rows = np.repeat(np.arange(M), k)
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+    values = np.asarray(kernel(distances[order]), dtype=float)
+    return _csr(rows, cols, values*np.ones(len(rows)), (M,N))
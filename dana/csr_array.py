@@ -35,64 +35,189 @@ import numpy as np
 import scipy.sparse as sp
 from scipy.sparse import isspmatrix
 from scipy.sparse.sputils import isdense, isscalarlike, isintlike
+try:
+    from scipy.sparse._sparsetools import csr_matvec
+except ImportError:
+    from scipy.sparse.sparsetools import csr_matvec
+from parallel import pmap, get_num_threads
+
+# Minimum number of non zero values for parallel matrix/vector product
+parallel_threshold = 2**14
 
 
 class csr_array(sp.csr_matrix):
-    """ Sparse array with a fixed mask """
+    """ Sparse array with a fixed mask
+
+    The mask is the structure of the matrix (indices and indptr), including
+    explicitly stored zeros. Row ids of stored values are derived lazily from
+    indptr and cached. Index arrays are kept as int32 whenever both the
+    number of stored values and the dimensions are below 2**31.
+    """
 
     def __init__(self, *args, **kwargs):
-        """ Build array and create mask based on non zero values """
+        """ Build array and compact its index arrays """
         sp.csr_matrix.__init__(self, *args, **kwargs)
-        #self.mask = (1-np.isnan(self.data)).nonzero()
-        self.mask = self.nonzero()
+        self._row_cache = None
+        self.compact()
+
+
+    def compact(self):
+        """ Store indices and indptr as int32 when they fit """
+        limit = np.iinfo(np.int32).max
+        if self.indptr[-1] < limit and max(self.shape) < limit:
+            if self.indices.dtype != np.int32:
+                self.indices = self.indices.astype(np.int32)
+            if self.indptr.dtype != np.int32:
+                self.indptr = self.indptr.astype(np.int32)
+        return self
 
 
-    def __binary_op__ (self, other, operand):
-        """ Generic binary op (+,-,/,*) implementation """
-        
+    @property
+    def row_ids(self):
+        """ Row of each stored value (cached, int32 when it fits) """
+        cached = getattr(self, '_row_cache', None)
+        if cached is None or cached[0] is not self.indptr \
+           or cached[1].size != self.indptr[-1]:
+            M = self.shape[0]
+            dtype = np.int32 if M < np.iinfo(np.int32).max else np.intp
+            rows = np.repeat(np.arange(M, dtype=dtype), np.diff(self.indptr))
+            self._row_cache = cached = self.indptr, rows
+        return cached[1]
+
+
+    @property
+    def mask(self):
+        """ Row and column of each stored value """
+        return self.row_ids, self.indices
+
+
+    def copy(self):
+        """ Copy array, sharing the (immutable) row ids cache """
+        Z = sp.csr_matrix.copy(self)
+        cached = getattr(self, '_row_cache', None)
+        if cached is not None and cached[0] is self.indptr:
+            Z._row_cache = Z.indptr, cached[1]
+        return Z
+
+
+    def _align(self, other):
+        """ Return other as a scalar or as values aligned with self.data """
+
         M,N = self.shape
-        operand = getattr(self.data, operand)
-        mask = self.mask
         if isscalarlike(other):
-            operand(other)
-            return self
+            return other
         elif sp.issparse(other):
             if other.shape != self.shape:
                 raise ValueError, "inconsistent shapes"
-            data = np.array(sp.lil_matrix(other)[mask].todense())
-            operand(data.reshape(data.size))
-            return self
-        try:
-            other.shape
-        except AttributeError:
-            other = np.asanyarray(other)
+            return self._merge(other)
         other = np.asanyarray(other)
 
         if other.size == 1:
-            operand(other[0])
-            return self
+            return other.ravel()[0]
 
         if other.ndim == 1 or other.ndim == 2 and other.shape[0] == 1:
             if other.shape == (N,):
-                operand(other[mask[1]])
+                return other[self.indices]
             elif other.shape == (1,N):
-                operand(other[0,mask[1]])
-#            elif len(self.data) == other.size:
-#                operand(other.flatten())
+                return other[0,self.indices]
             else:
                 raise ValueError('dimension mismatch')
         elif other.ndim == 2:
             if other.shape == (M,1):
-                operand(other[mask[0],0])
+                return other[self.row_ids,0]
             elif other.shape == (M,N):
-                operand(other[mask[0],mask[1]])
+                return other[self.row_ids,self.indices]
             else:
                 raise ValueError('dimension mismatch')
         else:
             raise ValueError('could not interpret dimensions')
+
+
+    def _same_structure(self, other):
+        """ Whether other stores values at the same positions as self """
+
+        if other.shape != self.shape or other.nnz != self.nnz:
+            return False
+        return ((other.indptr is self.indptr or
+                 np.array_equal(other.indptr, self.indptr)) and
+                (other.indices is self.indices or
+                 np.array_equal(other.indices, self.indices)))
+
+
+    def _merge(self, other):
+        """ Return values of sparse other at the stored positions of self
+
+        Operands sharing the structure of self are used as is. Otherwise,
+        positions are matched on their (sorted) flat keys row*N+col, values
+        missing from other being 0.
+        """
+
+        if not sp.isspmatrix_csr(other):
+            other = other.tocsr()
+        if self._same_structure(other):
+            return other.data
+        if not other.has_canonical_format:
+            other = other.copy()
+            other.sum_duplicates()
+        data = np.zeros(self.nnz, dtype=other.dtype)
+        if not other.nnz or not self.nnz:
+            return data
+        M,N = self.shape
+        rows = np.repeat(np.arange(M, dtype=np.int64), np.diff(other.indptr))
+        keys = rows*N + other.indices
+        index = self.row_ids.astype(np.int64)*N + self.indices
+        position = np.minimum(np.searchsorted(keys, index), keys.size-1)
+        found = keys[position] == index
+        data[found] = other.data[position[found]]
+        return data
+
+
+    def __binary_op__ (self, other, operand):
+        """ Generic binary op (+,-,/,*) implementation """
+
+        getattr(self.data, operand)(self._align(other))
         return self
 
 
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """ Apply ufunc to stored values
+
+        Operands are aligned with the structure of self (see __binary_op__)
+        and the ufunc is applied to data only. Results share the structure
+        of self. Outputs given with out= must be csr_array with the same
+        structure (or plain arrays of size nnz) and are written in place.
+        """
+
+        if method != '__call__':
+            return NotImplemented
+        args = [x.data if x is self else self._align(x) for x in inputs]
+        out = kwargs.pop('out', None)
+        if out is not None:
+            for Z in out:
+                if isinstance(Z, csr_array) and not self._same_structure(Z):
+                    raise ValueError('output structure mismatch')
+            kwargs['out'] = tuple(Z.data if isinstance(Z, csr_array) else Z
+                                  for Z in out)
+            ufunc(*args, **kwargs)
+            return out[0] if len(out) == 1 else out
+        result = ufunc(*args, **kwargs)
+        if ufunc.nout == 1:
+            return self._with_values(result)
+        return tuple(self._with_values(data) for data in result)
+
+
+    def _with_values(self, data):
+        """ Return a new array sharing the structure of self """
+
+        Z = csr_array((data, self.indices, self.indptr), shape=self.shape,
+                      copy=False)
+        Z.indices, Z.indptr = self.indices, self.indptr
+        cached = getattr(self, '_row_cache', None)
+        if cached is not None and cached[0] is self.indptr:
+            Z._row_cache = cached
+        return Z
+
+
     def __iadd__(self, other): # self += other
         return self.__binary_op__(other, '__iadd__')
 
@@ -138,30 +263,20 @@ class csr_array(sp.csr_matrix):
     def __neg__(self):
         return self.copy().__mul__(-1)
 
-    def cos(self):
-        Z = self.copy()
-        Z.data = np.cos(Z.data)
-        return Z
+    def cos(self, out=None):
+        return np.cos(self, out=out)
 
-    def sin(self):
-        Z = self.copy()
-        Z.data = np.sin(Z.data)
-        return Z
+    def sin(self, out=None):
+        return np.sin(self, out=out)
 
-    def exp(self):
-        Z = self.copy()
-        Z.data = np.exp(Z.data)
-        return Z
+    def exp(self, out=None):
+        return np.exp(self, out=out)
 
-    def sqrt(self):
-        Z = self.copy()
-        Z.data = np.sqrt(Z.data)
-        return Z
+    def sqrt(self, out=None):
+        return np.sqrt(self, out=out)
 
-    def abs(self):
-        Z = self.copy()
-        Z.data = np.abs(Z.data)
-        return Z
+    def abs(self, out=None):
+        return np.absolute(self, out=out)
 
     def sum(self, axis=None):
         """Sum the matrix over the given axis.  If the axis is None, sum
@@ -188,9 +303,84 @@ class csr_array(sp.csr_matrix):
         #     raise ValueError, "axis out of bounds"
 
 
-def dot(A,B):
-    """ dot product AxB """
-
+def partition(A, n):
+    """
+    Partition rows of A into n chunks having (roughly) the same number of non
+    zero values and return the n+1 chunk boundaries.
+    """
+
+    cached = getattr(A, '_partition', None)
+    if cached is not None and cached[0] == (A.nnz, n):
+        return cached[1]
+    bounds = np.searchsorted(A.indptr, np.linspace(0, A.nnz, n+1))
+    bounds[0], bounds[-1] = 0, A.shape[0]
+    bounds = np.unique(bounds)
+    A._partition = (A.nnz, n), bounds
+    return bounds
+
+
+def row_positions(indptr, rows):
+    """
+    Return indptr and positions (within data) of the given rows of a csr
+    structure, such that data[positions] holds the values of these rows.
+    """
+
+    rows = np.asarray(rows, dtype=int).ravel()
+    start, stop = indptr[rows], indptr[rows+1]
+    lengths = stop - start
+    indptr = np.zeros(len(rows)+1, dtype=int)
+    indptr[1:] = np.cumsum(lengths)
+    positions = np.repeat(start - indptr[:-1], lengths) + np.arange(indptr[-1])
+    return indptr, positions
+
+
+def take_rows(A, rows):
+    """
+    Return given rows of csr matrix A as a csr matrix. Unlike fancy indexing,
+    explicitly stored zeros are kept.
+    """
+
+    indptr, positions = row_positions(A.indptr, rows)
+    return sp.csr_matrix((A.data[positions], A.indices[positions], indptr),
+                         shape=(len(indptr)-1, A.shape[1]))
+
+
+def take_columns(A, cols):
+    """
+    Return given columns of csc matrix A as rows of a csr matrix. Unlike fancy
+    indexing, explicitly stored zeros are kept.
+    """
+
+    A = sp.csr_matrix((A.data, A.indices, A.indptr), shape=A.shape[::-1])
+    return take_rows(A, cols)
+
+
+def dot(A,B,threads=None):
+    """
+    dot product AxB
+
+    If B is a vector and A is large enough, rows of A are partitioned into
+    chunks with the same number of non zero values that are multiplied in
+    parallel using the given number of threads (default to the number set
+    with :func:`set_num_threads`). Results are identical to the serial
+    product.
+    """
+
+    threads = threads or get_num_threads()
+    if threads > 1 and A.nnz >= parallel_threshold and \
+       isinstance(B, np.ndarray) and B.ndim == 1 and B.shape[0] == A.shape[1]:
+        dtype = np.result_type(A.dtype, B.dtype)
+        if dtype == A.dtype:
+            M, N = A.shape
+            B = B.astype(dtype, copy=False)
+            R = np.zeros(M, dtype=dtype)
+            bounds = partition(A, threads)
+            def matvec(i):
+                i0, i1 = bounds[i], bounds[i+1]
+                csr_matvec(i1-i0, N, A.indptr[i0:i1+1], A.indices, A.data,
+                           B, R[i0:i1])
+            pmap(matvec, range(len(bounds)-1), threads)
+            return R
     return sp.csr_matrix.__mul__(A,B)
     #._mul_sparse_matrix(B)).todense()
     #return (A._mul_sparse_matrix(B)).todense()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+Source history for delayed connections
+
+Delayed connections read past states of their source from a ring buffer that
+is preallocated and shared among all delayed connections having the same
+source. The buffer is advanced once per time step, when a connection that
+already read the current step propagates again (each delayed connection is
+thus expected to propagate once per time step).
+
+**Examples**
+
+>>> H = history(source, '', source.shape, 3)
+>>> H.record(connection, source)
+>>> S = H[2] # State of source two time steps ago
+"""
+import weakref
+import numpy as np
+
+# Histories indexed by (id of source, name of source field)
+_histories = {}
+
+
+class History(object):
+    """ Ring buffer of past states of a source """
+
+    def __init__(self, shape, depth=1):
+        """
+        **Parameters**
+
+        shape : tuple
+            Shape of source state
+        depth : int
+            Number of states to keep (maximum delay + 1)
+        """
+
+        self._buffer = np.zeros((depth,)+tuple(shape))
+        self._index = 0
+        self._readers = set()
+
+
+    def _get_depth(self):
+        return self._buffer.shape[0]
+    depth = property(_get_depth,
+                     doc='''Number of states kept in the buffer.''')
+
+
+    def grow(self, depth):
+        """ Make sure at least depth states are kept (preserving history) """
+
+        if depth <= self.depth:
+            return
+        d = np.arange(self.depth)
+        buffer = np.zeros((depth,)+self._buffer.shape[1:])
+        buffer[(self._index-d) % depth] = self._buffer[(self._index-d) % self.depth]
+        self._buffer = buffer
+
+
+    def record(self, reader, state):
+        """
+        Record current state of source on behalf of reader. Buffer is only
+        advanced if reader already read the current time step.
+        """
+
+        if not self._readers or id(reader) in self._readers:
+            self._index = (self._index+1) % self.depth
+            self._buffer[self._index] = state
+            self._readers = set()
+        self._readers.add(id(reader))
+
+
+    def __getitem__(self, delay):
+        """ Return state of source delay time steps ago """
+        return self._buffer[(self._index-delay) % self.depth]
+
+
+def history(source, name, shape, depth):
+    """
+    Return the history shared by all delayed connections reading the given
+    source (field), making sure it keeps at least depth states.
+    """
+
+    for key in _histories.keys():
+        if _histories[key]._source() is None:
+            del _histories[key]
+    key = id(source), name
+    H = _histories.get(key)
+    if H is None or H._source() is not source:
+        H = History(shape, depth)
+        H._source = weakref.ref(source)
+        _histories[key] = H
+    H.grow(depth)
+    return H
@@ -36,20 +36,46 @@ DenseConnection
 
 """
 import numpy as np
-from functions import extract
 from functions import extract, convolution_matrix
+from compact import CompactArray
+from mapped import MappedArray, block_size
 from connection import Connection, ConnectionError
 
 
 class DenseConnection(Connection):
     """ """
 
-    def __init__(self, source=None, target=None, weights=None, equation = '', toric=False):
+    def __init__(self, source=None, target=None, weights=None, equation = '',
+                 toric=False, events=None, storage=None, delays=0):
         """ """
 
         Connection.__init__(self, source, target, toric)
-        self.setup_weights(weights)
+        self.setup_events(events)
+        self._storage = None
+        if equation or storage is not None or not np.isscalar(delays) \
+                    or not self.setup_shared(weights, 'dense'):
+            self._shared = None
+            self.setup_weights(weights)
+            self.setup_storage(storage)
         self.setup_equation(equation)
+        self.setup_delays(delays)
+
+
+    def setup_storage(self, storage):
+        """
+        Setup reduced precision storage of weights ('float16' or 'int8', see
+        :class:`dana.compact.CompactArray`) or full precision (None). File
+        backed weights (np.memmap) are streamed by blocks of rows (see
+        :class:`dana.mapped.MappedArray`) unless a reduced precision is given.
+        """
+
+        if storage is None:
+            if isinstance(self._weights, np.memmap):
+                self._storage = MappedArray(self._weights)
+                self._weights = None
+            return
+        self._storage = CompactArray(self._weights, storage)
+        self._weights = None
 
 
     def setup_weights(self, weights):
@@ -61,9 +87,15 @@ class DenseConnection(Connection):
 
         if weights.shape == (self.target.size, self.source.size):
             self._weights = weights
-            self._mask = 1-np.isnan(self._weights).astype(np.int32)
-            if self._mask.all():
-                self._mask = 1
+            # Mask is built by blocks of rows such that file backed weights
+            # are never entirely loaded in memory
+            n = max(1, block_size//max(weights.shape[1],1))
+            mask, valid = [], True
+            for i in range(0, weights.shape[0], n):
+                V = ~np.isnan(weights[i:i+n])
+                valid = valid and V.all()
+                mask.append(np.packbits(V, axis=1))
+            self._mask = 1 if valid else np.concatenate(mask)
             return
 
         if len(weights.shape) != len(weights.shape):
@@ -78,19 +110,50 @@ class DenseConnection(Connection):
             weights = extract(weights, np.minimum(s,w), w//2)
 
         K = convolution_matrix(self.source, self.target, weights, self._toric)
-        nz_rows = K.row
-        nz_cols = K.col
-        self._weights = K.todense()
-        self._mask = np.zeros(K.shape)
-        self._mask[nz_rows, nz_cols] = 1
-        if self._mask.all(): self._mask = 1
+        V = np.zeros(K.shape, dtype=bool)
+        V[K.row, K.col] = True
+        self._mask = 1 if V.all() else np.packbits(V, axis=1)
         self._weights = np.array(K.todense())
 
 
+    def _synapses(self):
+        """ Return rows, columns and positions (flat indices) of valid weights """
+
+        if self._weights is None:
+            raise ConnectionError, \
+                'Per-synapse delays require weights to be held in memory'
+        M, N = self._weights.shape
+        if self._mask is 1:
+            positions = np.arange(M*N)
+        else:
+            positions = np.flatnonzero(self._mask_rows(slice(None)))
+        return positions//N, positions%N, positions
+
+
+    def _mask_rows(self, rows):
+        """ Return mask (unpacked from bitmap) of given rows """
+        return np.unpackbits(self._mask[rows], axis=1)[:,:self.source.size]
+
+
     def output(self):
         """ """
 
-        R = np.dot(self._weights, self._actual_source.ravel()) 
+        if self._shared is not None:
+            self._shared._actual_source = self._actual_source
+            return self._shared.output()
+        if self._buckets is not None:
+            return self._output_delays(self._weights.reshape(-1))
+        source = self._actual_source.ravel()
+        index = self.active_units()
+        if self._storage is not None:
+            if index is not None:
+                R = np.dot(self._storage.columns(index), source[index])
+            else:
+                R = self._storage.dot(source)
+        elif index is not None:
+            R = np.dot(self._weights[:,index], source[index])
+        else:
+            R = np.dot(self._weights, source)
         return R.reshape(self._target.shape)
 
 
@@ -98,22 +161,53 @@ class DenseConnection(Connection):
         """ Update weights relative to connection equation """
         if not self._equation:
             return
+        if self._storage is not None:
+            self._evaluate_blocks(self._storage, dt)
+            return
         Connection.evaluate(self,dt)
         if self._mask is not 1:
-            self._weights *= self._mask
+            self._weights *= self._mask_rows(slice(None))
+
+
+    def _evaluate_blocks(self, weights, dt):
+        """
+        Update stored weights relative to connection equation, one block of
+        rows at a time (row-wise arguments are sliced accordingly) and using
+        stochastic rounding when storing them back.
+        """
+        self._update_kwargs()
+        M = self.target.size
+        for rows in weights.blocks():
+            W = weights.load(rows)
+            kwargs = {}
+            for key, value in self._kwargs.items():
+                if isinstance(value, np.ndarray) and value.ndim == 2 \
+                                              and value.shape[0] == M:
+                    value = value[rows]
+                kwargs[key] = value
+            self._equation._in_out = W
+            self._equation.evaluate(W, dt, **kwargs)
+            if self._mask is not 1:
+                W *= self._mask_rows(rows)
+            weights.store(rows, W, stochastic=True)
 
 
     def __getitem__(self, key):
         """ """
+        if self._shared is not None:
+            return self._shared[key]
         src = self.source
         dst = self.target
         to_flat_index = np.ones(len(dst.shape), dtype=int)
         to_flat_index[:-1] = dst.shape[:-1]
         index = (key*to_flat_index).sum()
-        weights = np.array(self._weights[index]).ravel()
+        if self._storage is not None:
+            weights = self._storage.load(slice(index,index+1)).ravel()
+        else:
+            weights = np.array(self._weights[index]).ravel()
         mask = self._mask
         if mask is not 1:
-            nz = np.array(self._mask[index]).ravel().nonzero()
+            nz = self._mask_rows(slice(index,index+1)).ravel().nonzero()
             masked_weights = np.zeros(weights.size)*np.NaN
             masked_weights[nz] = weights[nz]
             return masked_weights.reshape(self.source.shape)
@@ -121,3 +215,52 @@ class DenseConnection(Connection):
             return weights.reshape(self.source.shape)
 
        
+
+
+    def _receptive_fields(self, units):
+        """ Return receptive fields of given units as a csr matrix """
+
+        if self._shared is not None:
+            return self._shared._receptive_fields(units)
+        if self._weights is not None:
+            W = self._weights[units]
+        else:
+            W = self._storage.load(units)
+        if self._mask is 1:
+            valid = np.ones(W.shape, dtype=bool)
+        else:
+            valid = self._mask_rows(units).astype(bool)
+        return self._valid_matrix(W, valid)
+
+
+    def _projective_fields(self, units):
+        """ Return projective fields of given units as a csr matrix """
+
+        if self._shared is not None:
+            return self._shared._projective_fields(units)
+        if self._weights is not None:
+            W = self._weights[:,units].T
+        else:
+            W = self._storage.columns(units).T
+        if self._mask is 1:
+            valid = np.ones(W.shape, dtype=bool)
+        else:
+            valid = ((self._mask[:,units//8] >> (7-units%8)) & 1).T.astype(bool)
+        return self._valid_matrix(W, valid)
+
+
+    def _get_weights(self):
+        """ Get weights (materialized on demand if backed by shared) """
+        if self._shared is not None:
+            K = self._kernel
+            if self._toric:
+                s = np.array(self.source.shape)
+                w = np.array(K.shape)
+                K = extract(K, np.minimum(s,w), w//2)
+            return convolution_matrix(self.source, self.target,
+                                      K, self._toric).toarray()
+        if self._storage is not None:
+            return self._storage.toarray()
+        return self._weights
+    weights = property(_get_weights,
+        doc='''Weights matrix.''')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+FFT backend
+
+Real n-dimensional FFT functions used by all FFT based connections. The
+backend is selected once per process, using the first available among:
+
+* ``'pyfftw'``: FFTW plans (with aligned input buffers) are built once for
+  each array shape (and each calling thread since plans own their buffers)
+  and reused afterwards
+* ``'scipy'``: scipy.fft (scipy >= 1.4)
+* ``'numpy'``: numpy.fft
+
+Multithreaded backends use the number of threads given by
+:func:`dana.set_num_threads`.
+
+**Examples**
+
+>>> set_backend('numpy')
+>>> print get_backend()
+numpy
+"""
+import threading
+import numpy as np
+from parallel import get_num_threads
+
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+# Available backends, by order of preference
+backends = [name for name, module in [('pyfftw', pyfftw),
+                                      ('scipy', scipy_fft),
+                                      ('numpy', np)] if module is not None]
+_backend = backends[0]
+
+# FFTW plans of each thread indexed by (direction, shape, dtype, s, axes,
+# threads)
+_local = threading.local()
+
+
+def set_backend(name):
+    """
+    Set FFT backend.
+
+    **Parameters**
+
+    name : str
+        One of 'pyfftw', 'scipy' or 'numpy' (must be available)
+    """
+    global _backend
+    if name not in backends:
+        raise ValueError, 'FFT backend %s is not available' % name
+    _backend = name
+
+
+def get_backend():
+    """ Return the name of the FFT backend in use. """
+    return _backend
+
+
+def _plan(builder, a, s, axes):
+    """ Return cached FFTW plan (of the calling thread) for arrays like a """
+
+    if s is not None:
+        s = tuple(s)
+    if axes is not None:
+        axes = tuple(axes)
+    threads = get_num_threads()
+    key = builder.__name__, a.shape, a.dtype, s, axes, threads
+    plans = getattr(_local, 'plans', None)
+    if plans is None:
+        plans = _local.plans = {}
+    if key not in plans:
+        buffer = pyfftw.empty_aligned(a.shape, dtype=a.dtype)
+        plans[key] = builder(buffer, s=s, axes=axes, threads=threads,
+                             planner_effort='FFTW_MEASURE')
+    return plans[key]
+
+
+def rfftn(a, s=None, axes=None):
+    """ Return n-dimensional FFT of real array a """
+
+    if _backend == 'pyfftw':
+        a = np.asarray(a, dtype=float)
+        return _plan(pyfftw.builders.rfftn, a, s, axes)(a).copy()
+    elif _backend == 'scipy':
+        return scipy_fft.rfftn(a, s, axes, workers=get_num_threads())
+    return np.fft.rfftn(a, s, axes)
+
+
+def irfftn(a, s=None, axes=None):
+    """ Return n-dimensional inverse FFT of a (real result) """
+
+    if _backend == 'pyfftw':
+        a = np.asarray(a, dtype=complex)
+        return _plan(pyfftw.builders.irfftn, a, s, axes)(a).copy()
+    elif _backend == 'scipy':
+        return scipy_fft.irfftn(a, s, axes, workers=get_num_threads())
+    return np.fft.irfftn(a, s, axes)
@@ -36,6 +36,7 @@ import numpy as np
 import scipy.linalg
 import scipy.sparse as sp
 from scipy.ndimage.filters import convolve
+from scipy.ndimage.filters import convolve1d as convolve1d_
 from group import Group
 
 def best_fft_shape(shape):
@@ -121,7 +122,7 @@ def convolve1d(Z, K, toric=False):
 
 
 
-def convolve2d(Z, K, USV = None, toric=False):
+def convolve2d(Z, K, USV = None, toric=False, energy=1.0):
     """ Discrete, clamped convolution of two two-dimensional arrays.
 
         The convolution operator is often seen in signal processing, where it
@@ -141,6 +142,9 @@ def convolve2d(Z, K, USV = None, toric=False):
             (U,S,V) as a result of scipy.linalg.svd(K).
         :param bool toric:
             Indicate whether convolution should be considered toric
+        :param float energy:
+            Fraction of the kernel energy (sum of squared singular values)
+            that must be kept when truncating the decomposition rank.
         :return: 
             Discrete, clamped, linear convolution of `Z` and `K`.
 
@@ -164,14 +168,20 @@ def convolve2d(Z, K, USV = None, toric=False):
     else:
         U,S,V = USV
     n = (S > 1e-12).sum()
-#    n = (S > 0).sum()
-    R = np.zeros( Z.shape )
+    if energy < 1.0 and n > 1:
+        E = np.cumsum(S[:n]**2)
+        n = min(n, np.searchsorted(E, energy*E[-1]) + 1)
+    if toric:
+        mode = 'wrap'
+    else:
+        mode = 'constant'
+    dtype = np.result_type(Z.dtype, S.dtype, float)
+    R = np.zeros(Z.shape, dtype=dtype)
+    T = np.empty(Z.shape, dtype=dtype)
+    Zt = np.empty(Z.shape, dtype=dtype)
     for k in range(n):
-        Zt = Z.copy() * S[k]
-        for i in range(Zt.shape[0]):
-            Zt[i,:] = convolve1d(Zt[i,:], V[k,::-1], toric)
-        for i in range(Zt.shape[1]):
-            Zt[:,i] = convolve1d(Zt[:,i], U[::-1,k], toric)
+        convolve1d_(Z, V[k,::-1]*S[k], axis=1, mode=mode, output=T)
+        convolve1d_(T, U[::-1,k], axis=0, mode=mode, output=Zt)
         R += Zt
     return R
 
@@ -73,7 +73,8 @@ class Group(object):
     * :meth:`dana.empty_like` : Return a empty group with shape and type of input.
     """
 
-    def __init__(self, shape=(), dtype=float, model=None, fill=0.0, base=None):
+    def __init__(self, shape=(), dtype=float, model=None, fill=0.0, base=None,
+                 positions=None):
         """
         Creates a new group
 
@@ -94,6 +95,10 @@ class Group(object):
 
         fill : scalar
             Fill value to be used to fill group fields
+
+        positions : array, optional
+            Coordinates of units (shape (size, ndim)) for groups whose units
+            do not lie on a regular grid
         """
 
         # Model is prevalent over dtype
@@ -138,6 +143,7 @@ class Group(object):
         object.__setattr__(self, '_connections', [])
         object.__setattr__(self, '_model', model)
         object.__setattr__(self, '_namespace', {})
+        object.__setattr__(self, '_positions', None)
 
         for key in self._keys:
             self._data[key] = np.empty(shape=shape,
@@ -155,6 +161,9 @@ class Group(object):
         for eq in model._declarations:
             self._saved[eq._varname] = self._data[eq._varname]
 
+        if positions is not None:
+            self.positions = positions
+
         if base is None:
             __default_network__.append(self)
         try:
@@ -413,7 +422,10 @@ class Group(object):
         elif type(key) in [int, slice, tuple]:
             shape = self._data.values()[0][key].shape
             if shape is not ():
-                G = Group(shape, self._dtype)
+                positions = self.positions
+                if positions is not None:
+                    positions = positions.reshape(self.shape+(-1,))[key]
+                G = Group(shape, self._dtype, positions=positions)
                 for name in self._dtype.names:
                     G.data[name] = self.data[name][key]
                 return G
@@ -621,6 +633,22 @@ class Group(object):
                            doc='''Group connections''')
 
 
+    def _get_positions(self):
+        """Get group units positions"""
+        if self._positions is None and self._base is not None \
+           and self._base.size == self.size:
+            return self._base.positions
+        return self._positions
+    def _set_positions(self, positions):
+        """Set group units positions"""
+        if positions is not None:
+            positions = np.array(positions, dtype=float)
+            positions = positions.reshape((self.size, -1))
+        object.__setattr__(self, '_positions', positions)
+    positions = property(_get_positions, _set_positions,
+                         doc='''Units positions (None for a regular grid)''')
+
+
     def _get_model(self):
         """Get group model"""
         return self._model
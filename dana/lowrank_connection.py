@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+LowRankConnection
+
+"""
+import numpy as np
+import scipy.linalg
+import scipy.sparse as sparse
+import scipy.sparse.linalg
+from functions import extract, convolution_matrix
+from connection import Connection, ConnectionError
+
+
+class LowRankConnection(Connection):
+    """
+    Connection whose (target.size x source.size) weights matrix W is stored as
+    a product of two factors U (target.size x k) and V (k x source.size), such
+    that propagation and memory cost O((target.size+source.size)*k) instead of
+    O(target.size*source.size).
+
+    Factors are obtained from the truncated singular value decomposition of
+    the given weights (a full matrix or a kernel), or can be given directly as
+    a (U,V) tuple. Relative approximation error (Frobenius norm) is available
+    through the ``error`` property. Missing connections (NaN weights or
+    entries absent from sparse weights) are remembered as a sparse mask of
+    either missing or valid positions, whichever is smaller.
+
+    **Example:**
+
+      >>> src, tgt = np.ones((32,32)), np.ones((32,32))
+      >>> C = LowRankConnection(src, tgt, np.random.random((1024,1024)), rank=16)
+      >>> print C.rank, C.error
+    """
+
+    def __init__(self, source=None, target=None, weights=None, equation = '',
+                 toric=False, rank=None):
+        """ """
+
+        Connection.__init__(self, source, target, toric)
+        self._rank = rank
+        self.setup_weights(weights)
+        self.setup_equation(equation)
+
+
+    def setup_weights(self, weights):
+        """ Setup weights """
+
+        M, N = self.target.size, self.source.size
+
+        # Factors are given directly
+        if type(weights) in [tuple, list]:
+            U, V = weights
+            U, V = np.asarray(U), np.asarray(V)
+            if U.shape[0] != M or V.shape[1] != N or U.shape[1] != V.shape[0]:
+                raise ConnectionError, \
+                    'Weights factors shape is wrong relative to source and target'
+            self._U, self._V = U, V
+            self._mask, self._mask_valid = None, False
+            self._error = 0.0
+            if self._rank is None:
+                self._rank = U.shape[1]
+            return
+
+        if type(weights) in [int,float]:
+            weights = np.ones((1,)*len(self.source.shape))*weights
+
+        if not sparse.issparse(weights) and weights.shape != (M,N):
+            if len(weights.shape) != len(self.source.shape):
+                raise ConnectionError, \
+                    'Weights matrix shape is wrong relative to source and target'
+            # If we have a toric connection, weights cannot be greater than source
+            # in any dimension
+            if self._toric:
+                s = np.array(self.source.shape)
+                w = np.array(weights.shape)
+                weights = extract(weights, np.minimum(s,w), w//2)
+            weights = convolution_matrix(self.source, self.target,
+                                         weights, self._toric)
+        self._factorize(weights)
+
+
+    def _factorize(self, W):
+        """ Compute factors from the truncated SVD of W """
+
+        M, N = W.shape
+        k = self._rank
+        if sparse.issparse(W):
+            W = W.tocsr()
+            valid = W.copy()
+            valid.data = np.isfinite(W.data)
+            valid.eliminate_zeros()
+            self._setup_mask(valid)
+            W.data = np.nan_to_num(W.data)
+            norm = (W.data**2).sum()
+        else:
+            if np.isfinite(W).all():
+                self._setup_mask(None)
+            else:
+                self._setup_mask(np.isfinite(W))
+            W = np.nan_to_num(W)
+            norm = (W**2).sum()
+        if k is not None and k < min(M,N)-1:
+            U,S,V = scipy.sparse.linalg.svds(W, k)
+            I = np.argsort(S)[::-1]
+            U,S,V = U[:,I], S[I], V[I]
+            residual = max(norm - (S**2).sum(), 0)
+        else:
+            if sparse.issparse(W):
+                W = W.toarray()
+            U,S,V = scipy.linalg.svd(W, full_matrices=False)
+            if k is None:
+                k = len(S)
+            residual = (S[k:]**2).sum()
+            U,S,V = U[:,:k], S[:k], V[:k]
+        n = (S > 1e-12).sum()
+        residual += (S[n:]**2).sum()
+        U,S,V = U[:,:n], S[:n], V[:n]
+        self._U = U*S
+        self._V = V
+        if norm > 0:
+            self._error = np.sqrt(residual/norm)
+        else:
+            self._error = 0.0
+
+
+    def _setup_mask(self, valid):
+        """
+        Remember missing connections given validity of weights (None if all
+        weights are valid, dense boolean array or sparse matrix of valid
+        positions). Valid or missing positions are stored as a sparse matrix,
+        whichever are fewer.
+        """
+
+        self._mask, self._mask_valid = None, False
+        if valid is None:
+            return
+        M, N = valid.shape
+        if sparse.issparse(valid):
+            count = valid.nnz
+        else:
+            count = int(valid.sum())
+        if count == M*N:
+            return
+        if 2*count <= M*N:
+            self._mask, self._mask_valid = sparse.csr_matrix(valid), True
+        else:
+            if sparse.issparse(valid):
+                valid = valid.toarray()
+            self._mask = sparse.csr_matrix(~valid)
+
+
+    def _valid(self, shape, rows, cols=None):
+        """
+        Return validity (dense boolean array of given shape) of the weights
+        at given rows (and columns).
+        """
+
+        if self._mask is None:
+            return np.ones(shape, dtype=bool)
+        V = self._mask[rows]
+        if cols is not None:
+            V = V[:,cols]
+        V = V.toarray() != 0
+        if self._mask_valid:
+            return V.reshape(shape)
+        return ~V.reshape(shape)
+
+
+    def output(self):
+        """ """
+
+        R = np.dot(self._U, np.dot(self._V, self._actual_source.ravel()))
+        return R.reshape(self._target.shape)
+
+
+    def evaluate(self, dt=0.01):
+        """
+        Update weights relative to connection equation
+
+        **Notes**
+
+        Equations are evaluated on the full weights matrix, which is
+        temporarily materialized before being factorized again at the same
+        rank: learning costs O(target.size*source.size) memory and time per
+        call, plus the truncated SVD. When no rank was given (and weights
+        were not given as factors), factorization is done at full rank.
+        """
+        if not self._equation:
+            return
+        self._weights = self.weights
+        if self._mask is not None:
+            M, N = self._weights.shape
+            self._weights[~self._valid((M,N), slice(None))] = np.nan
+        Connection.evaluate(self,dt)
+        self._factorize(self._weights)
+        self._weights = None
+
+
+    def _receptive_fields(self, units):
+        """ Return receptive fields of given units as a csr matrix """
+
+        W = np.dot(self._U[units], self._V)
+        return self._valid_matrix(W, self._valid(W.shape, units))
+
+
+    def _projective_fields(self, units):
+        """ Return projective fields of given units as a csr matrix """
+
+        W = np.dot(self._U, self._V[:,units]).T
+        return self._valid_matrix(W, self._valid(W.shape[::-1],
+                                                 slice(None), units).T)
+
+
+    def __getitem__(self, key):
+        """ """
+        key = tuple(np.atleast_1d(key))
+        index = np.ravel_multi_index(key, self.target.shape)
+        weights = np.dot(self._U[index], self._V)
+        if self._mask is not None:
+            valid = self._valid(weights.shape, [index])
+            weights = np.where(valid, weights, np.nan)
+        return weights.reshape(self.source.shape)
+
+
+    weights = property(lambda self: np.dot(self._U, self._V),
+        doc='''Weights matrix (materialized from factors).''')
+
+    factors = property(lambda self: (self._U, self._V),
+        doc='''Weights factors (U,V) such that weights = U*V.''')
+
+    rank = property(lambda self: self._V.shape[0],
+        doc='''Rank of the weights matrix.''')
+
+    error = property(lambda self: self._error,
+        doc='''Relative approximation error (Frobenius norm) of weights.''')
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+File-backed storage for connection weights
+
+A MappedArray wraps a dense weights matrix living in a file (np.memmap) that
+may be larger than physical memory. Rows are streamed through a bounded buffer,
+one block at a time, the next block being read in a background thread while
+the current one is used. Updated blocks are written back to the file.
+
+**Examples**
+
+>>> W = np.memmap('weights.dat', dtype=float, mode='w+', shape=(1000,1000))
+>>> R = MappedArray(W).dot(np.ones(1000))
+"""
+import numpy as np
+from parallel import prefetch
+
+# Maximum number of values held in a buffer
+block_size = 2**20
+
+
+class MappedArray(object):
+    """ Dense 2d array stored in a file and accessed by blocks of rows """
+
+    def __init__(self, W):
+        """
+        **Parameters**
+
+        W : np.memmap
+            File-backed 2d array (must be writable for learning)
+        """
+
+        self._W = W
+        self.shape = W.shape
+
+
+    def blocks(self):
+        """ Return slices of rows holding at most block_size values each """
+
+        M, N = self.shape
+        n = max(1, block_size//max(N,1))
+        return [slice(i,min(i+n,M)) for i in range(0,M,n)]
+
+
+    def load(self, rows):
+        """ Return an in-memory copy of given rows (slice) """
+        return np.array(self._W[rows], dtype=float)
+
+
+    def store(self, rows, values, stochastic=False):
+        """ Write values of given rows (slice) back to the file """
+        self._W[rows] = values
+
+
+    def dot(self, x):
+        """ Matrix/vector product streaming blocks of rows """
+
+        R = np.zeros(self.shape[0])
+        x = np.asarray(x, dtype=float)
+        blocks = self.blocks()
+        for rows, values in zip(blocks, prefetch(self.load, blocks)):
+            R[rows] = np.dot(values, x)
+        return R
+
+
+    def columns(self, index):
+        """ Return an in-memory copy of given columns """
+
+        M = self.shape[0]
+        R = np.empty((M, len(index)))
+        blocks = self.blocks()
+        load = lambda rows: np.array(self._W[rows][:,index], dtype=float)
+        for rows, values in zip(blocks, prefetch(load, blocks)):
+            R[rows] = values
+        return R
+
+
+    def toarray(self):
+        """ Return underlying memory-mapped array """
+        return self._W
+
+
+    nbytes = property(lambda self: min(self.shape[0],
+                                       max(1, block_size//max(self.shape[1],1)))
+                      * self.shape[1] * 2 * self._W.itemsize,
+        doc='''Number of bytes held in memory (two buffers).''')
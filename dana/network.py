@@ -79,6 +79,13 @@ class Network(object):
     def evaluate(self,time):
         """ """
 
+        # FFT of same shape connections are computed by batches
+        from shared_connection import batch_fft
+        connections = []
+        for group in self._groups:
+            connections.extend(group._connections)
+        batch_fft(connections)
+
         for group in self._groups:
             group.propagate()
 
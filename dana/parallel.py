@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+Thread pool shared by computing kernels that release the GIL (FFT over
+tiles, sparse matrix products over row chunks, etc.). The number of threads
+is process-wide and defaults to 1, meaning that everything is computed
+serially in the calling thread.
+
+**Examples**
+
+>>> set_num_threads(4)
+>>> print get_num_threads()
+4
+"""
+from multiprocessing.pool import ThreadPool
+
+_threads = 1
+_pools = {}
+_io_pool = None
+
+
+def set_num_threads(n):
+    """
+    Set the number of threads used by parallel computing kernels.
+
+    **Parameters**
+
+    n : int
+        Number of threads (1 disables threading)
+    """
+    global _threads
+    n = max(int(n),1)
+    for size in _pools.keys():
+        if size != n:
+            _pools.pop(size).terminate()
+    _threads = n
+
+
+def get_num_threads():
+    """ Return the number of threads used by parallel computing kernels. """
+    return _threads
+
+
+def pmap(func, items, threads=None):
+    """
+    Apply func to each item using a persistent thread pool (or serially if
+    only one thread is used) and return the list of results.
+
+    **Parameters**
+
+    func : callable
+        Function to be applied
+    items : iterable
+        Function arguments
+    threads : int
+        Number of threads for this call (default to :func:`get_num_threads`)
+    """
+    items = list(items)
+    threads = max(int(threads or _threads),1)
+    if threads <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    if threads not in _pools:
+        _pools[threads] = ThreadPool(threads)
+    return _pools[threads].map(func, items)
+
+
+def prefetch(func, items):
+    """
+    Iterate over func(item) for each item, computing the next result in a
+    background thread while the current one is being used (such that reading
+    data from disk overlaps with computing). At most two results are held in
+    memory at once.
+    """
+    global _io_pool
+    items = list(items)
+    if len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+    if _io_pool is None:
+        _io_pool = ThreadPool(1)
+    pending = _io_pool.apply_async(func, (items[0],))
+    for item in items[1:]:
+        result = pending.get()
+        pending = _io_pool.apply_async(func, (item,))
+        yield result
+    yield pending.get()
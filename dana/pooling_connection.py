@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+PoolingConnection
+
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from connection import Connection, ConnectionError
+
+
+class PoolingConnection(Connection):
+    """
+    Spatial pooling connection where each target unit is the maximum, mean
+    or L2 norm of source units within a window. Windows are read through a
+    strided view of a (padded) copy of the source such that pooling is a
+    single reduction. When no stride is given, windows are centered on
+    source positions sampled as for other connection types (source and
+    target can have any shape). When a stride is given, the window of target
+    unit i starts at source unit i*stride.
+
+    **Example:**
+
+      >>> src = np.random.random((64,64))
+      >>> tgt = np.zeros((32,32))
+      >>> C = PoolingConnection(src, tgt, window=2, stride=2, op='max')
+    """
+
+    ops = ['max', 'mean', 'l2']
+
+    def __init__(self, source=None, target=None, window=2, stride=None,
+                 op='max', toric=False):
+        """
+        **Parameters**
+
+        source : Group
+            Source group
+        target : Group
+            Target group
+        window : int or tuple
+            Window shape
+        stride : int, tuple or None
+            Distance between consecutive windows (None for resampling)
+        op : str
+            Pooling operation ('max', 'mean' or 'l2')
+        toric : bool
+            Whether windows wrap around source boundaries
+        """
+
+        Connection.__init__(self, source, target, toric)
+        if op not in self.ops:
+            raise ConnectionError, 'Unknown pooling operation (%s)' % op
+        self._op = op
+        self.setup_windows(window, stride)
+        self.setup_equation(None)
+
+
+    def setup_windows(self, window, stride):
+        """ Setup padding and strided view of source windows """
+
+        src, tgt = self.source.shape, self.target.shape
+        d = len(src)
+        if len(tgt) != d:
+            raise ConnectionError, \
+                'Source and target must have the same number of dimensions'
+        if np.isscalar(window):
+            window = (window,)*d
+        if stride is not None and np.isscalar(stride):
+            stride = (stride,)*d
+        if len(window) != d or (stride is not None and len(stride) != d):
+            raise ConnectionError, \
+                'Window (or stride) shape does not match source shape'
+
+        # Window start positions in source (for each dimension)
+        starts = []
+        for i in range(d):
+            if stride is None:
+                center = np.rint(np.linspace(0,1,tgt[i])*(src[i]-1)).astype(int)
+                starts.append(center - (window[i]-1)//2)
+            else:
+                starts.append(np.arange(tgt[i])*stride[i])
+
+        # Padded source (indices of source units, wrapped if toric)
+        self._pad_indices, self._pad_slices, steps = [], [], []
+        for i in range(d):
+            lo = max(0, -starts[i].min())
+            hi = max(0, starts[i].max()+window[i]-src[i])
+            index = np.arange(-lo, src[i]+hi)
+            self._pad_indices.append(index)
+            self._pad_slices.append(slice(lo, lo+src[i]))
+            starts[i] = starts[i] + lo
+            step = np.diff(starts[i])
+            steps.append(step[0] if len(step) and (step == step[0]).all()
+                         and step[0] > 0 else None)
+        shape = tuple([len(index) for index in self._pad_indices])
+        if self._toric:
+            self._pad_indices = np.ix_(*[index % n for index, n
+                                         in zip(self._pad_indices, src)])
+        self._pad_slices = tuple(self._pad_slices)
+
+        # Strided view of windows: directly at window positions if they are
+        # regularly spaced, else at every position and then sampled
+        fill = {'max': -np.inf, 'mean': 0, 'l2': 0}[self._op]
+        self._buffer = np.ones(shape)*fill
+        strides = self._buffer.strides
+        if None not in steps:
+            origin = tuple([slice(s[0],None) for s in starts])
+            self._windows = as_strided(self._buffer[origin],
+                shape = tgt + tuple(window),
+                strides = tuple([st*s for st,s in zip(steps, strides)])+strides)
+            self._window_indices = None
+        else:
+            self._windows = as_strided(self._buffer,
+                shape = tuple([n-w+1 for n,w in zip(shape,window)])+tuple(window),
+                strides = strides+strides)
+            self._window_indices = np.ix_(*starts)
+        self._axes = tuple(range(d,2*d))
+
+        # Number of actual source units within each window (mean pooling)
+        self._counts = np.prod(window)
+        if self._op == 'mean' and not self._toric:
+            self._counts = self.pool(np.ones(src), 'sum')
+
+
+    def pool(self, Z, op):
+        """ Pool Z (shaped as source) using given operation """
+
+        if self._toric:
+            self._buffer[...] = Z[self._pad_indices]
+        else:
+            self._buffer[self._pad_slices] = Z
+        windows = self._windows
+        if self._window_indices is not None:
+            windows = windows[self._window_indices]
+        if op == 'max':
+            return windows.max(axis=self._axes)
+        elif op == 'l2':
+            return np.sqrt((windows**2).sum(axis=self._axes))
+        elif op == 'mean':
+            return windows.sum(axis=self._axes)/self._counts
+        return windows.sum(axis=self._axes)
+
+
+    def output(self):
+        """ """
+        return self.pool(self._actual_source.reshape(self.source.shape),
+                         self._op)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+ReductionConnection
+
+"""
+import numpy as np
+from connection import Connection, ConnectionError
+
+
+class ReductionConnection(Connection):
+    """
+    Global connection where every target unit receives the same reduction of
+    the whole source (for example global inhibition as the sum of source
+    activity), computed in O(N) instead of using a dense matrix of ones.
+    Available reductions are:
+
+    * ``'sum'``: sum of source units
+    * ``'max'``: maximum of source units
+    * ``'argmax'``: one-hot vector of the (first) maximum source unit (target
+      must have the same size as source)
+    * ``'l1'``: L1 norm of source
+    * ``'l2'``: L2 norm of source
+    * ``'softmax'``: softmax denominator (sum of exponentials of source units)
+
+    **Example:**
+
+      >>> src = np.random.random((50,50))
+      >>> tgt = np.zeros((50,50))
+      >>> C = ReductionConnection(src, tgt, 'sum', scale=-0.1)
+    """
+
+    ops = {'sum':     np.sum,
+           'max':     np.max,
+           'l1':      lambda Z: np.abs(Z).sum(),
+           'l2':      lambda Z: np.sqrt(np.dot(Z,Z)),
+           'softmax': lambda Z: np.exp(Z).sum()}
+
+    def __init__(self, source=None, target=None, op='sum', scale=1.0):
+        """
+        **Parameters**
+
+        source : Group
+            Source group
+        target : Group
+            Target group
+        op : str
+            Reduction ('sum', 'max', 'argmax', 'l1', 'l2' or 'softmax')
+        scale : float
+            Output scaling factor
+        """
+
+        Connection.__init__(self, source, target)
+        if op not in self.ops and op != 'argmax':
+            raise ConnectionError, 'Unknown reduction (%s)' % op
+        if op == 'argmax' and self.target.size != self.source.size:
+            raise ConnectionError, \
+                'argmax reduction requires source and target of same size'
+        self._op = op
+        self._scale = scale
+        self.setup_equation(None)
+
+
+    def output(self):
+        """ """
+
+        source = self._actual_source.ravel()
+        R = np.zeros(self._target.shape)
+        if self._op == 'argmax':
+            if source.size:
+                R.flat[np.argmax(source)] = self._scale
+        else:
+            R[...] = self._scale*self.ops[self._op](source)
+        return R
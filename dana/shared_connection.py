@@ -35,16 +35,18 @@
 SharedConnection
 
 """
-import inspect
+import time
 import scipy
+import scipy.sparse
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from parallel import pmap, get_num_threads
+from scipy.ndimage.filters import convolve
 from functions import extract, convolve1d, convolve2d, best_fft_shape
+from csr_array import take_columns
 from connection import Connection, ConnectionError
-from numpy.fft import fft, ifft
-from numpy.fft import fft2, ifft2
-from numpy.fft import rfft, irfft
-from numpy.fft import rfft2, irfft2
-from numpy.fft import fftshift, ifftshift
+from fft_backend import rfftn, irfftn
+from numpy.fft import ifftshift
 #from scipy.fftpack import fft, ifft, fft2, ifft2
 #from numpy import fftshift, ifftshift
 #from scipy.fftpack import rfft, irfft, rfft2, irfft2
@@ -53,15 +55,27 @@ from numpy.fft import fftshift, ifftshift
 class SharedConnection(Connection):
     """ """
 
-    def __init__(self, source=None, target=None, weights=None, toric=False, fft=True):
-        """ """
+    def __init__(self, source=None, target=None, weights=None, toric=False, fft=True,
+                 delays=0, blocks=None, energy=1.0):
+        """
+        If blocks is None, overlap-save convolution is used for large fields
+        with small kernels using the FFT size found fastest (see
+        :meth:`setup_blocks`). If blocks is False, it is never used and if
+        blocks is an integer, it gives the FFT size of blocks.
+
+        Energy is the fraction of the kernel energy kept when truncating the
+        rank of separable (SVD) 2d convolutions (see :func:`convolve2d`).
+        """
 
         Connection.__init__(self, source, target, toric)
-        self._src_rows = None
-        self._src_cols = None
+        self._src_indices = None
         self._fft = fft
+        self._block_size = blocks
+        self._energy = energy
+        self._batched = None
         self.setup_weights(weights)
         self.setup_equation(None)
+        self.setup_delays(delays)
 
 
     def setup_weights(self, weights):
@@ -74,170 +88,387 @@ class SharedConnection(Connection):
             w = np.array(weights.shape)
             weights = extract(weights, np.minimum(s,w), w//2)
 
-        # 1d convolution case
-        # -------------------
-        if len(self.source.shape) == len(self.target.shape) == 1:
-            if len(weights.shape) != 1:
-                raise ConnectionError, \
-                 '''Shared connection requested but weights matrix shape does not match.'''
-            if self.source.shape != self.target.shape:
-                rows = np.rint((np.linspace(0,1,self.target.shape[0])
-                                *(self.source.shape[0]-1))).astype(int)
-                self._src_rows = rows
-
-            if self._fft:
-                src_shape = np.array(self.source.shape)
-                wgt_shape = np.array(weights.shape)
-                K = np.nan_to_num(weights)[::-1]
-                if self._toric:
-                    K_ = extract(K, src_shape, wgt_shape//2)
-                    self._fft_weights = rfft(ifftshift(K_))
-                else:
-                    size = src_shape+wgt_shape//2
-                    shape = best_fft_shape(size)
-                    self._fft_weights = rfft(K,shape[0])
-                    i0 = wgt_shape[0]//2
-                    i1 = i0+src_shape[0]
-                    self._fft_indices = slice(i0,i1)
-                    self._fft_shape = shape
-
-                # m = self.source.shape[0]
-                # p = weights.shape[0]
-                # if self._toric:
-                #     _weights = extract(weights[::-1], (m,), (np.floor(p/2.0),) )
-                # else:
-                #     self._src_holder = np.zeros(2*m+1)
-                #     _weights = extract(weights[::-1], (2*m+1,), (np.floor(p/2.0),) )
-                # self._fft_weights = fft(ifftshift(np.nan_to_num(_weights)))
-
-
-            self._mask = np.ones(weights.shape)
-            self._mask[np.isnan(weights).nonzero()] = 0
-            self._weights = np.nan_to_num(weights)
-
-
-        # 2d convolution case
-        # -------------------
-        elif len(self.source.shape) == len(self.target.shape) == 2:
-            if len(weights.shape) != 2:
-                raise ConnectionError, \
-                    '''Shared connection requested but weights matrix shape does not match.'''
-            if self.source.shape != self.target.shape:
-                rows = np.rint((np.linspace(0,1,self.target.shape[0])
-                                *(self.source.shape[0]-1))).astype(int)
-                cols = np.rint((np.linspace(0,1,self.target.shape[1])
-                                *(self.source.shape[1]-1))).astype(int)
-                self._src_rows = rows.reshape((len(rows),1))
-                self._src_cols = cols.reshape((1,len(cols)))
-
-            if self._fft:
-                src_shape = np.array(self.source.shape)
-                wgt_shape = np.array(weights.shape)
-                K = np.nan_to_num(weights)[::-1,::-1]
-                if self._toric:
-                    K_ = extract(K, src_shape, wgt_shape//2)
-                    self._fft_weights = rfft2(ifftshift(K_))
-                else:
-                    size = src_shape+wgt_shape//2
-                    shape = best_fft_shape(size)
-                    self._fft_weights = rfft2(K,shape)
-                    i0 = wgt_shape[0]//2
-                    i1 = i0+src_shape[0]
-                    j0 = wgt_shape[1]//2
-                    j1 = j0+src_shape[1]
-                    self._fft_indices = slice(i0,i1),slice(j0,j1)
-                    self._fft_shape = shape
-
-            self._mask = np.ones(weights.shape)
-            self._mask[np.isnan(weights).nonzero()] = 0
-            self._weights = np.nan_to_num(weights)
+        if len(self.source.shape) != len(self.target.shape) or \
+           len(weights.shape) != len(self.source.shape):
+            raise ConnectionError, \
+             '''Shared connection requested but weights matrix shape does not match.'''
+
+        # Source indices to be sampled if target has a different shape
+        if self.source.shape != self.target.shape:
+            indices = []
+            for i in range(len(self.source.shape)):
+                index = np.rint((np.linspace(0,1,self.target.shape[i])
+                                 *(self.source.shape[i]-1))).astype(int)
+                indices.append(index)
+            self._src_indices = np.ix_(*indices)
+
+        if self._fft:
+            src_shape = np.array(self.source.shape)
+            wgt_shape = np.array(weights.shape)
+            K = np.nan_to_num(weights)[(slice(None,None,-1),)*len(wgt_shape)]
+            if self._toric:
+                K_ = extract(K, src_shape, wgt_shape//2)
+                self._fft_weights = rfftn(ifftshift(K_))
+            else:
+                size = src_shape+wgt_shape//2
+                shape = best_fft_shape(size)
+                self._fft_weights = rfftn(K,shape)
+                i0 = wgt_shape//2
+                i1 = i0+src_shape
+                self._fft_indices = tuple([slice(start,stop)
+                                           for start,stop in zip(i0,i1)])
+                self._fft_shape = shape
+                # Padded source buffer reused at each call
+                self._fft_buffer = np.zeros(shape)
+                self._fft_source = tuple([slice(0,n) for n in src_shape])
+
+        self._mask = np.ones(weights.shape)
+        self._mask[np.isnan(weights).nonzero()] = 0
+        self._weights = np.nan_to_num(weights)
+
+        # 2d convolution can be made separable
+        if len(weights.shape) == 2:
             dtype = weights.dtype
             self._USV = scipy.linalg.svd(np.nan_to_num(weights))
             U,S,V = self._USV
             self._USV = U.astype(dtype), S.astype(dtype), V.astype(dtype)
 
+        # If target is smaller than source, it may be cheaper to only compute
+        # sampled positions
+        self._decimation = None
+        if self._src_indices is not None and self.target.size < self.source.size:
+            from autotune import _properties
+            signature, costs = _properties(self.source, self.target,
+                                           weights, '', self._toric)
+            if self._fft: cost = costs['fft']
+            else:         cost = costs['svd']
+            k = (self._weights*self._mask != 0).sum()
+            if k*self.target.size < cost:
+                self.setup_decimation()
+
+        # Large fields with small kernels may be faster using overlap-save
+        self._blocks = None
+        blocks = self._block_size
+        if self._fft and not self._toric and self._decimation is None:
+            src_shape = np.array(self.source.shape)
+            wgt_shape = np.array(weights.shape)
+            if blocks is None:
+                if self.source.size >= 2**14 and \
+                   np.all(4*(wgt_shape-1) <= src_shape):
+                    self.setup_blocks()
+            elif blocks is not False:
+                self.setup_blocks(sizes=(blocks,), n=0)
+
+
+    def setup_decimation(self):
+        """
+        Precompute, for each non-null kernel value, the source indices (and
+        boundary weights) such that output can be computed by only visiting
+        target units.
+        """
+
+        src_shape = self.source.shape
+        kernel = self._weights*self._mask
+        indices, masks = [], []
+        for i in range(len(src_shape)):
+            n, w = src_shape[i], kernel.shape[i]
+            rows = np.rint((np.linspace(0,1,self.target.shape[i])
+                            *(n-1))).astype(int)
+            index = rows + (np.arange(w) - (w-1)//2).reshape((w,1))
+            if self._toric:
+                mask = np.ones(index.shape, dtype=bool)
+                index %= n
+            else:
+                mask = (index >= 0) & (index < n)
+                index = np.minimum(np.maximum(index,0),n-1)
+            indices.append(index)
+            masks.append(mask)
+        terms = []
+        for key in zip(*kernel.nonzero()):
+            index = [indices[i][j] for i,j in enumerate(key)]
+            mask = [masks[i][j] for i,j in enumerate(key)]
+            if np.all([m.all() for m in mask]):
+                weight = kernel[key]
+            else:
+                weight = kernel[key]*np.ones(self.target.shape)
+                for i,m in enumerate(mask):
+                    shape = [1,]*len(mask)
+                    shape[i] = m.size
+                    weight *= m.reshape(shape)
+                if not weight.any():
+                    continue
+            terms.append((np.ix_(*index), weight))
+        self._decimation = terms
+
+
+    def setup_blocks(self, sizes=(64,128,256,512), n=1):
+        """
+        Setup overlap-save convolution where source is tiled into blocks
+        whose FFT size is chosen among given sizes by measuring actual cost
+        (including whole field FFT). If n is 0, no measure is made and the
+        first suitable size is used. Blocks are processed in parallel
+        depending on the number of threads (see :func:`set_num_threads`).
+        """
+
+        src_shape = np.array(self.source.shape)
+        wgt_shape = np.array(self._weights.shape)
+        K = self._weights[(slice(None,None,-1),)*len(wgt_shape)]
+        source = np.ones(self.source.shape)
+
+        def measure():
+            self._output_fft(source)
+            t0 = time.time()
+            for i in range(n):
+                self._output_fft(source)
+            return (time.time()-t0)/n
+
+        self._blocks = None
+        best = np.inf
+        if n:
+            best = measure()
+        blocks = None
+        for size in sizes:
+            full = best_fft_shape(src_shape+wgt_shape-1)
+            shape = np.minimum(size, full)
+            block = shape - (wgt_shape-1)
+            if np.any(block < wgt_shape) or np.all(shape == full):
+                continue
+            count = -(-src_shape//block)
+            buffer = np.zeros(count*block + wgt_shape-1)
+            strides = np.array(buffer.strides)
+            tiles = as_strided(buffer, tuple(count)+tuple(shape),
+                               tuple(block*strides)+tuple(strides))
+            output = np.zeros(count*block)
+            interleaved = np.array([count,block]).T.ravel()
+            order = range(0,2*len(count),2) + range(1,2*len(count),2)
+            self._blocks = { 'spectrum' : rfftn(K, shape),
+                             'shape'    : shape,
+                             'block'    : block,
+                             'buffer'   : buffer,
+                             'tiles'    : tiles,
+                             'output'   : output,
+                             'out_tiles': output.reshape(interleaved).transpose(order),
+                             'source'   : tuple([slice(w//2, w//2+s) for w,s in
+                                                 zip(wgt_shape-1,src_shape)]),
+                             'valid'    : tuple([slice(w,w+b) for w,b in
+                                                 zip(wgt_shape-1,block)]),
+                             'result'   : tuple([slice(0,s) for s in src_shape]) }
+            if not n:
+                return
+            t = measure()
+            if t < best:
+                best, blocks = t, self._blocks
+        self._blocks = blocks
+
+
+    def _output_blocks(self, rows):
+        """ Compute overlap-save convolution for the given tile rows """
 
+        blocks = self._blocks
+        shape = blocks['shape']
+        axes = range(-len(shape),0)
+        P = rfftn(blocks['tiles'][rows], shape, axes)*blocks['spectrum']
+        R = irfftn(P, shape, axes)
+        blocks['out_tiles'][rows] = R[(Ellipsis,)+blocks['valid']]
 
-        # Higher dimensional case
-        # ------------------------
+
+    def _batch_key(self):
+        """
+        Return key identifying connections whose FFT can be computed within
+        a same batch (see :func:`batch_fft`) or None if FFT cannot be batched.
+        """
+
+        if not self._fft or self._blocks is not None \
+           or self._decimation is not None or self._history is not None:
+            return None
+        if self._toric:
+            return self.source.shape, self.source.shape, True
+        return self.source.shape, tuple(self._fft_shape), False
+
+
+    def _output_fft(self, source):
+        """ Compute FFT convolution of source """
+
+        if self._blocks is not None:
+            blocks = self._blocks
+            blocks['buffer'][blocks['source']] = source
+            count = blocks['tiles'].shape[0]
+            chunk = -(-count//get_num_threads())
+            pmap(self._output_blocks,
+                 [slice(i,i+chunk) for i in range(0,count,chunk)])
+            return blocks['output'][blocks['result']].copy()
+        if not self._toric:
+            self._fft_buffer[self._fft_source] = source
+            P = rfftn(self._fft_buffer)
+            P *= self._fft_weights
+            return irfftn(P, self._fft_shape)[self._fft_indices]
         else:
-            raise ConnectionError, \
-                '''Shared connection requested but dimensions are too high (> 2).'''
+            P = rfftn(source)
+            P *= self._fft_weights
+            return irfftn(P, source.shape)
 
 
     def output(self):
         """ """
 
-        # One dimension
-        if len(self._source.shape) == 1:
-            source = self._actual_source
-            # Use FFT convolution
-            if self._fft:
-                if not self._toric:
-                    P = rfft(source,self._fft_shape[0])*self._fft_weights
-                    R = irfft(P, self._fft_shape[0]).real
-                    R = R[self._fft_indices]
-                else:
-                    P = rfft(source)*self._fft_weights
-                    R = irfft(P,source.shape[0]).real
-
-                # if self._toric:
-                #     R  = ifft(fft(source)*self._fft_weights).real
-                # else:
-                #     n = source.shape[0]
-                #     self._src_holder[n//2:n//2+n] = source
-                #     R = ifft(fft(self._src_holder)*self._fft_weights)
-                #     R = R.real[n//2:n//2+n]
-            # Use regular convolution
-            else:
-                R = convolve1d(source, self._weights[::-1], self._toric)
-            if self._src_rows is not None:
-                R = R[self._src_rows]
-            return R.reshape(self._target.shape)
-        # Two dimensions
+        source = self._actual_source
+        # Only compute sampled positions
+        if self._decimation is not None:
+            R = np.zeros(self._target.shape)
+            for index, weight in self._decimation:
+                R += weight*source[index]
+            return R
+        # Use FFT convolution (possibly already computed within a batch)
+        if self._fft and self._batched is not None:
+            R, self._batched = self._batched, None
+        elif self._fft:
+            R = self._output_fft(source)
+        # Use regular convolution
+        elif len(source.shape) == 1:
+            R = convolve1d(source, self._weights[::-1], self._toric)
+        # Use SVD convolution
+        elif len(source.shape) == 2:
+            R = convolve2d(source, self._weights, self._USV, self._toric,
+                           self._energy)
+        # Use n-dimensional convolution
         else:
-            source = self._actual_source
-            # Use FFT convolution
-            if self._fft:
-                if not self._toric:
-                    P = rfft2(source,self._fft_shape)*self._fft_weights
-                    R = irfft2(P, self._fft_shape).real
-                    R = R[self._fft_indices]
-                else:
-                    P = rfft2(source)*self._fft_weights
-                    R = irfft2(P,source.shape).real
-
-            # Use SVD convolution
+            K = self._weights[(slice(None,None,-1),)*len(source.shape)]
+            if self._toric:
+                R = convolve(source, K, mode='wrap')
             else:
-                R = convolve2d(source, self._weights, self._USV, self._toric)
-            if self._src_rows is not None and self._src_cols is not None:
-                R = R[self._src_rows, self._src_cols]
+                R = convolve(source, K, mode='constant')
+        if self._src_indices is not None:
+            R = R[self._src_indices]
         return R.reshape(self._target.shape)
 
 
+    def _receptive_fields(self, units):
+        """ Return receptive fields of given units as a csr matrix """
+
+        src_shape = np.array(self.source.shape)
+        dst_shape = np.array(self.target.shape)
+        kernel = self._weights
+        kernel_shape = np.array(kernel.shape)
+
+        # Corresponding source units (using normalized coordinates)
+        dst_key = np.array(np.unravel_index(units, self.target.shape), dtype=float)
+        scale = np.where(dst_shape > 1, dst_shape-1, 1).astype(float)
+        src_key = np.rint((dst_key/scale.reshape((-1,1)))
+                          *(src_shape-1).reshape((-1,1))).astype(int)
+
+        # Kernel is centered on source units
+        nz = np.array(self._mask.nonzero())
+        center = (kernel_shape-1)//2
+        index = nz[:,np.newaxis,:] + (src_key-center.reshape((-1,1)))[:,:,np.newaxis]
+        rows = np.repeat(np.arange(len(units)), nz.shape[1])
+        values = np.tile(kernel[tuple(nz)], len(units))
+        index = index.reshape((len(src_shape),-1))
+        if self._toric:
+            index %= src_shape.reshape((-1,1))
+        else:
+            valid = ((index >= 0) & (index < src_shape.reshape((-1,1)))).all(0)
+            index, rows, values = index[:,valid], rows[valid], values[valid]
+        cols = np.ravel_multi_index(tuple(index), self.source.shape)
+        return scipy.sparse.csr_matrix((values, (rows, cols)),
+                                       shape=(len(units), self.source.size))
+
+
+    def _projective_fields(self, units):
+        """ Return projective fields of given units as a csr matrix """
+        W = self._receptive_fields(np.arange(self.target.size))
+        return take_columns(W.tocsc(), units)
+
+
     def __getitem__(self, key):
         """ """
 
-        src = self.source
-        dst = self.target
+        src_shape = np.array(self.source.shape)
+        dst_shape = np.array(self.target.shape)
         kernel = self._weights
-        src_shape = np.array(src.shape, dtype=float)
-        dst_shape = np.array(dst.shape, dtype=float)
-        kernel_shape = np.array(kernel.shape, dtype=float)
-        dst_key = np.array(key, dtype=float)
-        src_key = np.rint((dst_key/(dst_shape-1))*(src_shape-1)).astype(int)
-        scale = 1 #dst_shape/src_shape
-        Z = np.zeros(src.shape) * np.NaN
-        for i in range(kernel.size):
-            k_key = np.array(np.unravel_index(i, kernel.shape))
-            if self._toric:
-                key = (src_key + scale*k_key - kernel_shape//2).astype(int) % src_shape
-            else:
-                key = (src_key + scale*k_key - kernel_shape//2).astype(int)
-            bad = False
-            for k in range(len(key)):
-                if key[k] < 0 or key[k] >= Z.shape[k]: bad = True
-            if not bad:
-                if self._mask[tuple(k_key.tolist())]:
-                    Z[tuple(key.tolist())] = kernel[tuple(k_key.tolist())]
+        kernel_shape = np.array(kernel.shape)
+
+        # Corresponding source unit (using normalized coordinates)
+        dst_key = np.atleast_1d(key).astype(float)
+        scale = np.where(dst_shape > 1, dst_shape-1, 1).astype(float)
+        src_key = np.rint((dst_key/scale)*(src_shape-1)).astype(int)
+
+        # Kernel is centered on source unit
+        nz = np.array(self._mask.nonzero())
+        index = nz + (src_key - (kernel_shape-1)//2).reshape((-1,1))
+        if self._toric:
+            index %= src_shape.reshape((-1,1))
+        else:
+            valid = ((index >= 0) & (index < src_shape.reshape((-1,1)))).all(0)
+            index, nz = index[:,valid], nz[:,valid]
+        Z = np.zeros(self.source.shape) * np.NaN
+        Z[tuple(index)] = kernel[tuple(nz)]
         return Z
+
+
+def _batch_source(connection):
+    """ Return the source array a connection reads when propagated """
+
+    if connection._source_name:
+        return connection._source._data[connection._source_name]
+    return connection._actual_source
+
+
+def batch_fft(connections):
+    """
+    Compute FFT convolutions of connections (or of the shared connections
+    backing them) by batches of same FFT shape: distinct sources are stacked
+    and transformed at once and so are inverse transforms. Results are kept
+    by connections and used by their next output.
+
+    Connections whose source is the target of one of the given connections
+    are not batched since their source is only known once that target has
+    been propagated.
+    """
+
+    targets = [connection._actual_target for connection in connections
+               if getattr(connection, '_actual_target', None) is not None]
+    batches = {}
+    for connection in connections:
+        shared = getattr(connection, '_shared', None) or connection
+        if not isinstance(shared, SharedConnection) or \
+           getattr(connection, '_history', None) is not None:
+            continue
+        source = _batch_source(connection)
+        if [target for target in targets
+            if np.may_share_memory(source, target)]:
+            continue
+        key = shared._batch_key()
+        if key is not None:
+            batches.setdefault(key, []).append((connection, shared))
+
+    for (src_shape, shape, toric), items in batches.items():
+        if len(items) < 2:
+            continue
+        d = len(shape)
+        axes = range(1, d+1)
+
+        # Distinct sources
+        sources, index = [], {}
+        for connection, shared in items:
+            source = _batch_source(connection)
+            if id(source) not in index:
+                index[id(source)] = len(sources)
+                sources.append(source)
+        stack = np.zeros((len(sources),)+tuple(shape))
+        region = (slice(None),)+tuple([slice(0,n) for n in src_shape])
+        stack[region] = np.array([np.asarray(source).reshape(src_shape)
+                                  for source in sources])
+        spectra = rfftn(stack, axes=axes)
+
+        # Products and inverse transforms
+        products = np.empty((len(items),)+spectra.shape[1:], dtype=spectra.dtype)
+        for i, (connection, shared) in enumerate(items):
+            source = _batch_source(connection)
+            np.multiply(spectra[index[id(source)]], shared._fft_weights,
+                        products[i])
+        results = irfftn(products, shape, axes)
+        for i, (connection, shared) in enumerate(items):
+            if toric:
+                shared._batched = results[i]
+            else:
+                shared._batched = results[i][shared._fft_indices]
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+SigmaPiConnection
+
+"""
+import numpy as np
+from fft_backend import rfftn, irfftn
+from functions import best_fft_shape
+from connection import Connection, ConnectionError
+
+
+class SigmaPiConnection(Connection):
+    """
+    Multiplicative (sigma-pi) connection where the output is the convolution
+    of the source by a modulator group, i.e. the modulator acts as a kernel
+    that changes over time. Convolution is computed using FFT with a padded
+    layout that is set up once and spectra are only recomputed for the group
+    (source or modulator) that actually changed.
+
+    **Example:**
+
+      >>> src, mod, tgt = np.random.random((3,50,50))
+      >>> C = SigmaPiConnection(src, mod, tgt, scale=0.1)
+      >>> C.propagate()
+    """
+
+    def __init__(self, source=None, modulator=None, target=None, scale=1.0,
+                 toric=False):
+        """
+        **Parameters**
+
+        source : Group
+            Source group
+        modulator : Group
+            Modulator group (same number of dimensions as source)
+        target : Group
+            Target group
+        scale : float
+            Output scaling factor
+        toric : bool
+            Whether convolution is toric
+        """
+
+        Connection.__init__(self, source, target, toric)
+        self._scale = scale
+        self._src_indices = None
+
+        # Get actual modulator
+        names = modulator.dtype.names
+        if names is None:
+            self._actual_modulator = modulator
+            self._modulator_name = ''
+        else:
+            self._actual_modulator = modulator[names[0]]
+            self._modulator_name = names[0]
+        if modulator.base is None:
+            self._modulator = modulator
+        else:
+            self._modulator = modulator.base
+        self.setup_layout()
+        self.setup_equation(None)
+
+
+    def setup_layout(self):
+        """
+        Setup padded FFT layout. The modulator is placed in the padded buffer
+        such that the centered convolution is found at the origin of the
+        result, hence no shift or roll is ever needed.
+        """
+
+        src_shape = np.array(self.source.shape)
+        mod_shape = np.array(self._modulator.shape)
+        if len(src_shape) != len(mod_shape) or \
+           len(src_shape) != len(self.target.shape):
+            raise ConnectionError, \
+                'Source, modulator and target must have the same number of dimensions'
+        if self._toric:
+            if (mod_shape > src_shape).any():
+                raise ConnectionError, \
+                    'Toric modulator cannot be greater than source'
+            shape = src_shape
+        else:
+            shape = np.array(best_fft_shape(src_shape+mod_shape-1))
+        self._fft_shape = tuple(shape)
+        self._src_slices = tuple([slice(0,n) for n in src_shape])
+        self._mod_indices = np.ix_(*[(np.arange(w)-w//2) % n
+                                     for w,n in zip(mod_shape,shape)])
+        self._buffers = {'source': np.zeros(shape),
+                         'modulator': np.zeros(shape)}
+        self._spectra = {}
+
+        # Source indices to be sampled if target has a different shape
+        if self.source.shape != self.target.shape:
+            indices = []
+            for i in range(len(self.source.shape)):
+                index = np.rint((np.linspace(0,1,self.target.shape[i])
+                                 *(self.source.shape[i]-1))).astype(int)
+                indices.append(index)
+            self._src_indices = np.ix_(*indices)
+
+
+    def _spectrum(self, key, Z, index):
+        """ Return spectrum of Z (cached until Z changes) """
+
+        if key in self._spectra:
+            copy, spectrum = self._spectra[key]
+            if np.array_equal(copy, Z):
+                return spectrum
+        buffer = self._buffers[key]
+        buffer[index] = Z
+        spectrum = rfftn(buffer)
+        self._spectra[key] = Z.copy(), spectrum
+        return spectrum
+
+
+    def propagate(self):
+        """ Propagate activity from source to target """
+
+        if self._modulator_name:
+            self._actual_modulator = self._modulator._data[self._modulator_name]
+        Connection.propagate(self)
+
+
+    def output(self):
+        """ """
+
+        S = self._actual_source.reshape(self.source.shape)
+        M = self._actual_modulator.reshape(self._modulator.shape)
+        R = irfftn(self._spectrum('source', S, self._src_slices) *
+                   self._spectrum('modulator', M, self._mod_indices),
+                   self._fft_shape)[self._src_slices]
+        if self._src_indices is not None:
+            R = R[self._src_indices]
+        return R*self._scale
@@ -36,29 +36,60 @@ SparseConnection
 """
 import numpy as np
 import scipy.sparse as sparse
-from csr_array import csr_array, dot
+from csr_array import csr_array, dot, take_columns
 from functions import extract, convolution_matrix
+from compact import CompactArray
 from connection import Connection, ConnectionError
 
 
 class SparseConnection(Connection):
     """ """
 
-    def __init__(self, source=None, target=None, weights=None, equation = '', toric=False):
+    def __init__(self, source=None, target=None, weights=None, equation = '',
+                 toric=False, events=None, storage=None, delays=0):
         """ """
 
         Connection.__init__(self, source, target, toric)
-        self.setup_weights(weights)
+        self._csc = None
+        self._storage = None
+        self.setup_events(events)
+        if equation or storage is not None or not np.isscalar(delays) \
+                    or not self.setup_shared(weights, 'sparse'):
+            self._shared = None
+            self.setup_weights(weights)
+            self.setup_storage(storage)
         self.setup_equation(equation)
+        self.setup_delays(delays)
+
+
+    def setup_storage(self, storage):
+        """
+        Setup reduced precision storage of weights values ('float16' or
+        'int8', see :class:`dana.compact.CompactArray`) or full precision
+        (None). Structure (indptr and indices) is kept unchanged.
+        """
+
+        if storage is None:
+            return
+        self._storage = CompactArray(self._weights, storage)
+        self._weights = None
 
 
     def setup_weights(self, weights):
         """ Setup weights """
 
+        self._csc = None
         if type(weights) in [int,float]:
             weights = np.ones((1,)*len(self.source.shape))*weights
         dtype = weights.dtype
 
+        # Already built csr arrays (e.g. from connectivity generators) are
+        # copied as is, without being rebuilt
+        if isinstance(weights, csr_array) and not np.isnan(weights.data).any() \
+               and weights.shape == (self.target.size, self.source.size):
+            self._weights = weights.copy()
+            return
+
         # Is kernel already a sparse array ?
         if sparse.issparse(weights):
             if weights.shape != (self.target.size, self.source.size):
@@ -88,22 +119,192 @@ class SparseConnection(Connection):
         self._weights = csr_array(weights, dtype=dtype)
 
 
+    def _synapses(self):
+        """ Return rows, columns and positions (within data) of weights """
+
+        if self._weights is None:
+            raise ConnectionError, \
+                'Per-synapse delays require weights to be held in memory'
+        W = self._weights
+        return self._row_ids(), W.indices, np.arange(W.indptr[-1])
+
+
     def output(self):
         """ """
-        R = dot(self._weights, self._actual_source.ravel()) 
+        if self._shared is not None:
+            self._shared._actual_source = self._actual_source
+            return self._shared.output()
+        if self._buckets is not None:
+            return self._output_delays(self._weights.data)
+        source = self._actual_source.ravel()
+        if self._storage is not None:
+            return self._storage.dot(source).reshape(self._target.shape)
+        index = self.active_units()
+        if index is not None:
+            R = self._output_events(source, index)
+        else:
+            R = dot(self._weights, source)
         return R.reshape(self._target.shape)
 
 
+    def _output_events(self, source, index):
+        """ Sum weights columns of active source units (using a CSC view) """
+
+        if self._csc is None:
+            self._csc = self._weights.tocsc()
+        W = self._csc
+        start, stop = W.indptr[index], W.indptr[index+1]
+        lengths = stop - start
+        n = lengths.sum()
+        offsets = np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(n)
+        values = W.data[positions] * np.repeat(source[index], lengths)
+        return np.bincount(W.indices[positions], values,
+                           minlength=self.target.size)
+
+
+    def evaluate(self, dt=0.01):
+        """ Update weights relative to connection equation """
+        if not self._equation:
+            return
+        self._csc = None
+        if self._storage is not None:
+            self._evaluate_blocks(self._storage, dt)
+            return
+        self._evaluate_data(dt)
+
+
+    def _evaluate_blocks(self, weights, dt):
+        """
+        Update compact weights relative to connection equation, one block of
+        rows at a time such that only one block is held in full precision.
+        Values are stored back using stochastic rounding.
+        """
+
+        self._update_kwargs()
+        for rows in weights.blocks():
+            positions = weights._positions(rows)
+            ids = np.repeat(np.arange(rows.start, rows.stop, dtype=np.int32),
+                            np.diff(weights.indptr[rows.start:rows.stop+1]))
+            kwargs = self._gather(ids, weights.indices[positions])
+            if kwargs is None:
+                # Arguments that cannot be gathered do not depend on the
+                # block, such that no block has been updated yet: the equation
+                # is evaluated on a temporary full precision copy instead.
+                self._weights = weights.toarray()
+                Connection.evaluate(self, dt)
+                for rows in weights.blocks():
+                    weights.store(rows, weights._values(self._weights.data,
+                                                        rows), stochastic=True)
+                self._weights = None
+                return
+            data = weights.load(rows)
+            self._equation._in_out = data
+            self._equation.evaluate(data, dt, **kwargs)
+            weights.store(rows, data, stochastic=True)
+
+
+    def _evaluate_data(self, dt):
+        """
+        Update weights relative to connection equation, operating on non
+        zero values (data) only: pre and post arguments are gathered for each
+        non zero value (using column indices and row ids) such that cost is
+        O(nnz). Falls back to csr_array evaluation for arguments that cannot
+        be gathered.
+        """
+
+        W = self._weights
+        self._update_kwargs()
+        kwargs = self._gather(self._row_ids(), W.indices)
+        if kwargs is None:
+            return Connection.evaluate(self, dt)
+        self._equation._in_out = W.data
+        self._equation.evaluate(W.data, dt, **kwargs)
+
+
+    def _gather(self, rows, indices):
+        """
+        Return equation arguments gathered for values at given rows and
+        columns or None if some argument cannot be gathered.
+        """
+
+        M, N = self.target.size, self.source.size
+        kwargs = {}
+        for key, value in self._kwargs.items():
+            if isinstance(value, np.ndarray):
+                if value.shape == (1,N):
+                    value = value[0,indices]
+                elif value.shape == (M,1):
+                    value = value[rows,0]
+                elif value.shape == (M,N):
+                    value = value[rows,indices]
+                elif value.size == 1:
+                    value = value.ravel()[0]
+                else:
+                    return None
+            elif sparse.issparse(value):
+                return None
+            kwargs[key] = value
+        return kwargs
+
+
+    def _row_ids(self):
+        """ Return (cached) row of each non zero value """
+
+        return self._weights.row_ids
+
+
     def __getitem__(self, key):
         """ """
-        
+        if self._shared is not None:
+            return self._shared[key]
         src = self.source
         dst = self.target
         to_flat_index = np.ones(len(dst.shape), dtype=int)
         to_flat_index[:-1] = dst.shape[:-1]
         index = (key*to_flat_index).sum()
-        w = self._weights[index].tocoo()
         W = np.array([np.NaN,]*self.source.size)
-        W[w.col] = w.data
+        if self._storage is not None:
+            S = self._storage
+            positions = slice(S.indptr[index], S.indptr[index+1])
+            W[S.indices[positions]] = S.load(slice(index,index+1))
+        else:
+            w = self.weights[index].tocoo()
+            W[w.col] = w.data
         return W.reshape(self.source.shape)
 
+
+
+    def _receptive_fields(self, units):
+        """ Return receptive fields of given units as a csr matrix """
+
+        if self._shared is not None:
+            return self._shared._receptive_fields(units)
+        return Connection._receptive_fields(self, units)
+
+
+    def _projective_fields(self, units):
+        """ Return projective fields of given units as a csr matrix """
+
+        if self._shared is not None:
+            return self._shared._projective_fields(units)
+        if self._csc is None:
+            self._csc = self.weights.tocsc()
+        return take_columns(self._csc, units)
+
+
+    def _get_weights(self):
+        """ Get weights (materialized on demand if backed by shared) """
+        if self._shared is not None:
+            K = self._kernel
+            if self._toric:
+                s = np.array(self.source.shape)
+                w = np.array(K.shape)
+                K = extract(K, np.minimum(s,w), w//2)
+            W = convolution_matrix(self.source, self.target, K, self._toric)
+            return csr_array(W, dtype=K.dtype)
+        if self._storage is not None:
+            return self._storage.toarray()
+        return self._weights
+    weights = property(_get_weights,
+        doc='''Weights matrix.''')
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+"""
+StencilConnection
+
+"""
+import numpy as np
+from functions import extract
+from connection import Connection, ConnectionError
+from shared_connection import SharedConnection
+
+
+class StencilConnection(SharedConnection):
+    """
+    Shared connection for small kernels (up to 7 in each dimension) between
+    groups of same shape. Output is computed by adding, for each (non NaN)
+    kernel value, a shifted slice of the source to the target such that no
+    index array is ever needed. Toric connections split shifted slices at
+    the boundaries.
+
+    **Example:**
+
+      >>> Z = np.ones((5,5))
+      >>> C = StencilConnection(Z, Z, np.array([[1,1,1],[1,np.NaN,1],[1,1,1]]))
+    """
+
+    max_size = 7
+
+    def __init__(self, source=None, target=None, weights=None, toric=False,
+                 delays=0):
+        """ """
+
+        Connection.__init__(self, source, target, toric)
+        self._src_indices = None
+        self.setup_weights(weights)
+        self.setup_equation(None)
+        self.setup_delays(delays)
+
+
+    def setup_weights(self, weights):
+        """ Setup weights """
+
+        if self.source.shape != self.target.shape:
+            raise ConnectionError, \
+                '''Stencil connection requires source and target of same shape.'''
+        if len(weights.shape) != len(self.source.shape):
+            raise ConnectionError, \
+             '''Stencil connection requested but weights matrix shape does not match.'''
+
+        # If we have a toric connection, kernel cannot be greater than source
+        # in any dimension
+        if self._toric:
+            s = np.array(self.source.shape)
+            w = np.array(weights.shape)
+            weights = extract(weights, np.minimum(s,w), w//2)
+        if max(weights.shape) > self.max_size:
+            raise ConnectionError, \
+                '''Stencil connection requested but kernel is too big.'''
+
+        self._mask = np.ones(weights.shape)
+        self._mask[np.isnan(weights).nonzero()] = 0
+        self._weights = np.nan_to_num(weights)
+
+        # For each kernel value, compute (target,source) slices
+        self._stencil = []
+        shape = self.source.shape
+        for key in zip(*self._weights.nonzero()):
+            pieces = [((),())]
+            for i in range(len(shape)):
+                n = shape[i]
+                offset = key[i] - (weights.shape[i]-1)//2
+                if self._toric:
+                    offset %= n
+                    dim = [(slice(0,n-offset), slice(offset,n))]
+                    if offset:
+                        dim.append((slice(n-offset,n), slice(0,offset)))
+                elif abs(offset) >= n:
+                    # Kernel value falls outside of source
+                    pieces = []
+                    break
+                elif offset >= 0:
+                    dim = [(slice(0,n-offset), slice(offset,n))]
+                else:
+                    dim = [(slice(-offset,n), slice(0,n+offset))]
+                pieces = [(t+(tgt,), s+(src,)) for t,s in pieces
+                                               for tgt,src in dim]
+            if pieces:
+                self._stencil.append((self._weights[key], pieces))
+        self._buffer = np.empty(shape)
+
+
+    def accumulate(self, out):
+        """ Add connection output to out """
+
+        source = self._actual_source
+        buffer = self._buffer
+        for value, pieces in self._stencil:
+            for tgt, src in pieces:
+                if value == 1:
+                    out[tgt] += source[src]
+                else:
+                    np.multiply(source[src], value, buffer[tgt])
+                    out[tgt] += buffer[tgt]
+
+
+    def _batch_key(self):
+        """ Stencil connections do not use FFT """
+        return None
+
+
+    def propagate(self):
+        """ Propagate activity from source to target """
+
+        if self._source_name:
+            self._actual_source = self._source._data[self._source_name]
+        if self._target_name:
+            self._actual_target = self._target._data[self._target_name]
+        if self._history is not None:
+            self._delay()
+        self.accumulate(self._actual_target.reshape(self._target.shape))
+
+
+    def output(self):
+        """ """
+
+        R = np.zeros(self._target.shape)
+        self.accumulate(R)
+        return R
@@ -46,6 +46,15 @@ from dense_connection import *
 from sparse_connection import *
 from shared_connection import *
 from shared_connection_fft import *
+from autotune import *
+from lowrank_connection import *
+from stencil_connection import *
+from delay import *
+from sigmapi_connection import *
+from pooling_connection import *
+from reduction_connection import *
+from connectivity import *
+from fft_backend import *
 
 
 def test():
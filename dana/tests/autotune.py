@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from tools import np_almost_equal
+from dana import Connection, ConnectionError, select_engine
+from dana import DenseConnection, SparseConnection, SharedConnection
+
+
+class AutotuneTestCase(unittest.TestCase):
+
+    def test_1(self):
+        Z = np.ones((3,3))
+        C = Connection(Z, Z, np.ones((9,9)))
+        assert isinstance(C, DenseConnection)
+
+    def test_2(self):
+        Z = np.ones((20,20))
+        C = Connection(Z, Z, np.identity(400), engine='auto')
+        assert isinstance(C, SparseConnection)
+
+    def test_3(self):
+        Z = np.ones((50,50))
+        C = Connection(Z, Z, np.random.random((25,25)), engine='auto')
+        assert isinstance(C, SharedConnection)
+
+    def test_4(self):
+        Z = np.ones((50,50))
+        C = Connection(Z, Z, np.ones((5,5)), engine='auto', equation='dW/dt=1')
+        assert isinstance(C, (DenseConnection, SparseConnection))
+
+    def test_5(self):
+        Z = np.random.random((10,10))
+        K = np.random.random((3,3))
+        R = DenseConnection(Z, Z, K).output()
+        for engine in ['dense', 'sparse', 'fft', 'svd', 'auto']:
+            assert np_almost_equal(Connection(Z, Z, K, engine=engine).output(), R)
+
+    def test_6(self):
+        Z = np.random.random((10,10))
+        K = np.random.random((3,3))
+        R = DenseConnection(Z, Z, K, toric=True).output()
+        C = Connection(Z, Z, K, toric=True, engine='auto', timing=True)
+        assert np_almost_equal(C.output(), R)
+
+    def test_7(self):
+        Z = np.ones((10,10))
+        K = np.ones((3,3))
+        assert select_engine(Z, Z, K) == select_engine(Z, Z, 2*K)
+
+    def test_8(self):
+        Z = np.ones(3)
+        self.assertRaises(ConnectionError, Connection, Z, Z, np.ones(1),
+                          engine='unknown')
+
+    def test_9(self):
+        Z = np.ones((3,3))
+        C = Connection(Z, Z)
+        assert type(C) is Connection
+
+    def test_10(self):
+        Z = np.ones((3,3))
+        C = Connection(Z, Z, 0)
+        assert type(C) is Connection
+        assert not C._toric
+
+    def test_11(self):
+        import dana.autotune
+        Z = np.ones((13,13))
+        K = np.random.random((5,5))
+        calls = []
+        measure = dana.autotune._measure
+        def _measure(*args):
+            calls.append(args[-1])
+            return measure(*args)
+        dana.autotune._measure = _measure
+        try:
+            select_engine(Z, Z, K)
+            select_engine(Z, Z, K, timing=True)
+        finally:
+            dana.autotune._measure = measure
+        assert calls
+
+
+if __name__ == "__main__":
+    unittest.main()
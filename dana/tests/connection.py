@@ -34,9 +34,11 @@
 import unittest
 import numpy as np
 import scipy.sparse as sp
-from tools import np_equal
+from tools import np_equal, np_almost_equal
+from dana import convolve2d
 from dana import ConnectionError
 from dana import SparseConnection, DenseConnection, SharedConnection
+from dana import Connection, LowRankConnection
 from scipy.ndimage.filters import convolve, convolve1d
 
 class ConnectionOneDimensionTestCase(unittest.TestCase):
@@ -363,5 +365,169 @@ class ConnectionTwoDimensionTestCase(unittest.TestCase):
         assert np_equal(Z4,Z5)
 
 
+class SeparableConvolutionTestCase(unittest.TestCase):
+
+    def test_1(self):
+        Z = np.random.random((20,30))
+        K = np.outer(np.random.random(5), np.random.random(4))
+        R = convolve(Z, K[::-1,::-1], mode='constant')
+        assert np_almost_equal(convolve2d(Z, K), R)
+
+    def test_2(self):
+        Z = np.random.random((20,30))
+        K = np.random.random((5,5))
+        R = convolve(Z, K[::-1,::-1], mode='wrap')
+        assert np_almost_equal(convolve2d(Z, K, toric=True), R)
+
+    def test_3(self):
+        Z = np.random.random((20,30))
+        u, v = np.random.random(5), np.random.random(5)
+        K = np.outer(u,v) + 1e-6*np.random.random((5,5))
+        R = convolve1d(convolve1d(Z, v[::-1], axis=1, mode='constant'),
+                       u[::-1], axis=0, mode='constant')
+        assert np.abs(convolve2d(Z, K, energy=0.99) - R).max() < 1e-3
+
+    def test_4(self):
+        Z = np.random.random((20,30))
+        u, v = np.random.random(5), np.random.random(5)
+        K = np.outer(u,v) + 1e-3*np.random.random((5,5))
+        C = SharedConnection(Z, Z, K, fft=False, energy=0.99)
+        R = convolve2d(Z, K, energy=0.99)
+        assert np_almost_equal(C.output(), R)
+        assert not np_almost_equal(C.output(), convolve2d(Z, K))
+
+
+class SharedBackedTestCase(unittest.TestCase):
+
+    def test_1(self):
+        Z = np.random.random((40,40))
+        K = np.random.random((9,9))
+        C = DenseConnection(Z,Z,K)
+        assert C._shared is not None
+        R = convolve(Z, K[::-1,::-1], mode='constant')
+        assert np.abs(C.output()-R).max() < 1e-10
+
+    def test_2(self):
+        Z = np.random.random((40,40))
+        K = np.random.random((25,25))
+        C = SparseConnection(Z,Z,K,toric=True)
+        assert C._shared is not None
+        R = convolve(Z, K[::-1,::-1], mode='wrap')
+        assert np.abs(C.output()-R).max() < 1e-10
+
+    def test_3(self):
+        Z = np.random.random((20,20))
+        K = np.random.random((9,9))
+        K[0,0] = np.NaN
+        C = DenseConnection(Z,Z,K)
+        W = C.weights
+        assert C._shared is not None
+        assert W.shape == (400,400)
+        assert np.abs(np.dot(W,Z.ravel()).reshape(Z.shape)-C.output()).max() < 1e-10
+        assert np_equal(C[5,3], DenseConnection(Z,Z,K,'dW/dt=0')[5,3])
+
+    def test_4(self):
+        Z = np.random.random((40,40))
+        K = np.random.random((9,9))
+        C = DenseConnection(Z,Z,K,'dW/dt=0')
+        assert C._shared is None
+
+
+class FieldsTestCase(unittest.TestCase):
+
+    def check(self, C):
+        dst, src = C.target.shape, C.source.shape
+        R = C.receptive_fields()
+        assert R.shape == (C.target.size,)+src
+        for index in [(0,0), (1,2), (dst[0]-1,dst[1]-1)]:
+            unit = np.ravel_multi_index(index, dst)
+            assert np_equal(R[unit], C[index])
+            assert np_equal(C.receptive_fields([index])[0], C[index])
+        P = C.projective_fields()
+        assert P.shape == (C.source.size,)+dst
+        assert np_equal(P.reshape((C.source.size,-1)).T,
+                        R.reshape((C.target.size,-1)))
+        S = C.receptive_fields([0,3], sparse=True)
+        assert sp.issparse(S) and S.shape == (2,C.source.size)
+        assert np_equal(C.projective_fields([4]),
+                        P[4:5])
+
+    def test_dense(self):
+        W = np.random.random((25,25))
+        W[W < .2] = np.NaN
+        W[W < .4] = 0
+        self.check(DenseConnection(np.ones((5,5)), np.ones((5,5)), W))
+
+    def test_dense_kernel(self):
+        self.check(DenseConnection(np.ones((5,5)), np.ones((5,5)),
+                                   np.random.random((3,3))))
+
+    def test_sparse(self):
+        W = sp.rand(25,25,.3,format='csr')
+        self.check(SparseConnection(np.ones((5,5)), np.ones((5,5)), W))
+
+    def test_shared(self):
+        K = np.random.random((3,3))
+        K[1,1] = np.NaN
+        self.check(SharedConnection(np.ones((6,6)), np.ones((6,6)), K))
+        self.check(SharedConnection(np.ones((6,6)), np.ones((6,6)), K, True))
+        self.check(SharedConnection(np.ones((9,9)), np.ones((4,4)), K))
+
+    def test_shared_backed(self):
+        K = np.random.random((3,3))
+        C = DenseConnection(np.ones((20,20)), np.ones((20,20)), K)
+        assert C._shared is not None
+        self.check(C)
+
+    def test_explicit_zeros(self):
+        W = sp.rand(25,25,.3,format='csr')
+        W.data[::3] = 0
+        C = SparseConnection(np.ones((5,5)), np.ones((5,5)), W)
+        assert C.weights.nnz == W.nnz
+        self.check(C)
+        K = np.random.random((3,3))
+        K[0,1] = 0
+        self.check(SharedConnection(np.ones((6,6)), np.ones((6,6)), K))
+        self.check(SharedConnection(np.ones((9,9)), np.ones((4,4)), K))
+        W = np.random.random((25,25))
+        W[W < .3] = 0
+        W[W > .8] = np.NaN
+        C = DenseConnection(np.ones((5,5)), np.ones((5,5)), W)
+        R = Connection._receptive_fields(C, np.arange(25))
+        P = Connection._projective_fields(C, np.arange(25))
+        for unit in [0, 7, 24]:
+            Z = C.receptive_fields([unit])
+            assert np_equal(C._fields(R[unit], (5,5), False), Z)
+            assert np_equal(C._fields(P[unit], (5,5), False),
+                            C.projective_fields([unit]))
+            assert np_equal(Z[0], C[np.unravel_index(unit, (5,5))])
+
+    def test_lowrank(self):
+        W = np.random.random((25,25))
+        W[W < .2] = np.NaN
+        self.check(LowRankConnection(np.ones((5,5)), np.ones((5,5)), W))
+        self.check(LowRankConnection(np.ones((5,5)), np.ones((5,5)),
+                                     np.random.random((3,3)), rank=2))
+
+    def test_dense_storage(self):
+        W = np.random.random((25,25))
+        W[W < .2] = np.NaN
+        W[W > .9] = 0
+        for storage in ['float16', 'int8']:
+            C = DenseConnection(np.ones((5,5)), np.ones((5,5)), W,
+                                storage=storage)
+            self.check(C)
+
+    def test_sparse_learning(self):
+        W = sp.rand(25,25,.3,format='csr')
+        for storage in [None, 'float16']:
+            C = SparseConnection(np.ones((5,5)), np.ones((5,5)), W,
+                                 'dW/dt = 1', storage=storage)
+            P = C.projective_fields()
+            C.evaluate(dt=1)
+            assert np_almost_equal(C.projective_fields(), P+1, 1e-1)
+            self.check(C)
+
+
 if __name__ == "__main__":
     unittest.main()
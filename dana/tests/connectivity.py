@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from dana import Group, zeros, csr_array, SparseConnection
+from dana import fixed_probability, fixed_indegree
+from dana import fixed_outdegree, distance_probability, distance_weights
+
+
+class ConnectivityTestCase(unittest.TestCase):
+
+    def check(self, W, shape):
+        assert isinstance(W, csr_array)
+        assert W.shape == shape
+        assert W.has_sorted_indices
+        D = W.toarray()
+        assert (D != 0).sum() == W.nnz
+
+    def test_probability(self):
+        src, tgt = np.zeros((100,)), np.zeros((200,))
+        W = fixed_probability(src, tgt, 0.1)
+        self.check(W, (200,100))
+        assert abs(W.nnz - 2000) < 300
+        assert fixed_probability(src, tgt, 0).nnz == 0
+        assert fixed_probability(src, tgt, 1).nnz == 20000
+
+    def test_indegree(self):
+        src, tgt = np.zeros((10,10)), np.zeros((50,))
+        W = fixed_indegree(src, tgt, 7, lambda n: np.random.uniform(1,2,n))
+        self.check(W, (50,100))
+        assert (np.diff(W.indptr) == 7).all()
+        W = fixed_indegree(src, tgt, 90)
+        assert (np.diff(W.indptr) == 90).all()
+
+    def test_outdegree(self):
+        src, tgt = np.zeros((100,)), np.zeros((50,))
+        W = fixed_outdegree(src, tgt, 5, 2.0)
+        self.check(W, (50,100))
+        assert ((W.toarray() != 0).sum(0) == 5).all()
+        assert (W.data == 2.0).all()
+
+    def test_distance(self):
+        src, tgt = np.zeros((20,20)), np.zeros((20,20))
+        W = distance_probability(src, tgt, lambda d: d <= 2, 2)
+        self.check(W, (400,400))
+        D = W.toarray()
+        assert (D != 0).sum(1).max() == 13
+        assert (D != 0).sum(1).min() == 6
+        W = distance_probability(src, tgt, lambda d: d <= 2, 2, toric=True)
+        assert ((W.toarray() != 0).sum(1) == 13).all()
+
+    def test_distance_resampling(self):
+        src, tgt = np.zeros((20,20)), np.zeros((5,5))
+        W = distance_probability(src, tgt, lambda d: np.ones(d.shape), 0)
+        i = np.rint(np.linspace(0,19,5)).astype(int)
+        cols = np.ravel_multi_index(np.meshgrid(i,i,indexing='ij'), (20,20))
+        assert np.all(W.indices == cols.ravel())
+
+    def test_positions(self):
+        G = zeros((4,5), 'V')
+        assert G.positions is None
+        assert G('V').positions is None
+        P = np.random.random((20,2))
+        G.positions = P
+        assert np.allclose(G('V').positions, P)
+        G = zeros(20, 'V')
+        G.positions = np.random.random(20)
+        assert G.positions.shape == (20,1)
+
+    def test_positions_constructor(self):
+        P = np.random.random((20,2))
+        G = Group((20,), 'V', positions=P)
+        assert np.allclose(G.positions, P)
+        assert np.allclose(G[2:6].positions, P[2:6])
+        G = Group((4,5), 'V', positions=P)
+        assert np.allclose(G[1:3].positions, P[5:15])
+        assert np.allclose(G[:,1].positions, P[1::5])
+
+    def test_kdtree_radius(self):
+        src = zeros(200, 'V')
+        tgt = zeros(100, 'V')
+        src.positions = np.random.random((200,2))
+        tgt.positions = np.random.random((100,2))
+        W = distance_weights(src, tgt, lambda d: np.exp(-d), radius=0.2)
+        self.check(W, (100,200))
+        D = np.sqrt(((tgt.positions[:,np.newaxis]-src.positions)**2).sum(2))
+        R = np.where(D <= 0.2, np.exp(-D), 0)
+        assert np.allclose(W.toarray(), R)
+
+    def test_kdtree_knn(self):
+        src = zeros(200, 'V')
+        src.positions = np.random.random((200,3))
+        W = distance_weights(src, src, lambda d: 1+d, k=5)
+        self.check(W, (200,200))
+        assert (np.diff(W.indptr) == 5).all()
+        assert (W.toarray().diagonal() == 1).all()
+
+    def test_kdtree_grid(self):
+        src, tgt = np.zeros((10,10)), np.zeros((10,10))
+        W = distance_weights(src, tgt, lambda d: np.ones(d.shape), radius=0.12)
+        assert (W.toarray().diagonal() == 1).all()
+        assert (np.diff(W.indptr) <= 5).all() and W.nnz == 100+4*90
+
+    def test_connection(self):
+        src, tgt = np.random.random((100,)), np.zeros((50,))
+        W = fixed_probability(src, tgt, 0.2, lambda n: np.random.random(n))
+        C = SparseConnection(src, tgt, W)
+        assert C.weights is not W
+        assert np.allclose(C.output(), W.toarray().dot(src))
+
+    def test_connection_copy(self):
+        src, tgt = np.random.random((100,)), np.zeros((50,))
+        W = fixed_probability(src, tgt, 0.2, 1.0)
+        C1 = SparseConnection(src, tgt, W, 'dW/dt = 1')
+        C2 = SparseConnection(src, tgt, W, 'dW/dt = 1')
+        C1.evaluate(dt=1)
+        assert (W.data == 1).all()
+        assert (C1.weights.data == 2).all()
+        assert (C2.weights.data == 1).all()
+
+
+if __name__ == "__main__":
+    unittest.main()
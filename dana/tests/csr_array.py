@@ -34,7 +34,7 @@
 import unittest
 import numpy as np
 import scipy.sparse as sp
-from scipy.sparse import issparse
+from scipy.sparse import issparse, coo_matrix, csr_matrix
 from dana import *
 
 
@@ -153,6 +153,106 @@ class TestArray(unittest.TestCase):
         assert (As[0,0] == 2)
         assert (As[1,0] == 0)
 
+    def test_explicit_zeros(self):
+        data = np.array([1.0, 0.0, 2.0])
+        indices = np.array([0, 1, 2])
+        indptr = np.array([0, 2, 2, 3])
+        As = csr_array((data, indices, indptr), shape=(3,3))
+        As += np.ones((3,3))
+        assert (As.nnz == 3)
+        assert (np_equal(As.data, [2,1,3]))
+        assert (np_equal(As.row_ids, [0,0,2]))
+
+    def test_int32_indices(self):
+        indices = np.array([0, 1, 2], dtype=np.int64)
+        indptr = np.array([0, 2, 2, 3], dtype=np.int64)
+        As = csr_array((np.ones(3), indices, indptr), shape=(3,3))
+        assert (As.indices.dtype == np.int32)
+        assert (As.indptr.dtype == np.int32)
+        assert (As.row_ids.dtype == np.int32)
+
+    def test_row_ids_copy(self):
+        A = np.random.random((10,10))
+        A *= A < .5
+        As = csr_array(A)
+        rows = As.row_ids
+        assert (np_equal(rows, A.nonzero()[0]))
+        assert (As.row_ids is rows)
+        assert (As.copy().row_ids is rows)
+
+    def test_ufunc_out(self):
+        A = np.random.random((10,10))+1
+        A *= np.random.random((10,10)) < .5
+        As = csr_array(A)
+        data = As.data
+        Z = np.exp(As, out=As)
+        assert (Z is As)
+        assert (As.data is data)
+        assert (np_almost_equal(As, np.where(A, np.exp(A), 0)))
+
+    def test_ufunc_structure(self):
+        A = np.random.random((10,10))+1
+        A *= np.random.random((10,10)) < .5
+        As = csr_array(A)
+        Z = np.multiply(As, A)
+        assert (isinstance(Z, csr_array))
+        assert (Z.indices is As.indices and Z.indptr is As.indptr)
+        assert (np_almost_equal(Z, A*A))
+        np.add(Z, np.ones((10,1)), out=Z)
+        assert (np_almost_equal(Z, np.where(A, A*A+1, 0)))
+        assert (np_almost_equal(np.maximum(As, 1.5), np.where(A, np.maximum(A,1.5), 0)))
+
+    def test_ufunc_out_mismatch(self):
+        As = csr_array(np.eye(3))
+        Bs = csr_array(np.ones((3,3)))
+        self.assertRaises(ValueError, np.exp, As, out=Bs)
+
+    def test_sparse_same_structure(self):
+        A = np.random.random((10,10))
+        A *= A < .5
+        As, Bs = csr_array(A), csr_array(A)
+        Bs.data[...] = 2
+        As *= Bs
+        assert (np_almost_equal(As, 2*A))
+
+    def test_sparse_merge(self):
+        A = np.random.random((20,30))
+        A *= A < .5
+        B = np.random.random((20,30))
+        B *= B < .5
+        As = csr_array(A)
+        As += coo_matrix(B)
+        assert (np_almost_equal(As, np.where(A, A+B, 0)))
+        Bs = csr_matrix((np.ones(3), [1,0,1], [0,3,3,3]), shape=(3,2))
+        Cs = csr_array(np.ones((3,2)))
+        Cs += Bs
+        assert (np_equal(Cs, [[2,3],[1,1],[1,1]]))
+
+    def test_parallel_dot(self):
+        A = np.random.random((300,200))
+        A *= np.random.random((300,200)) < .5
+        A[:50] = 0
+        As = csr_array(A)
+        B = np.random.random(200)
+        R = dot(As, B)
+        for threads in [2,3,7]:
+            assert np.array_equal(dot(As, B, threads), R)
+        set_num_threads(4)
+        try:
+            assert np.array_equal(dot(As, B), R)
+        finally:
+            set_num_threads(1)
+
+    def test_pmap_threads(self):
+        import time, threading
+        from dana.parallel import pmap
+        def worker(i):
+            time.sleep(.01)
+            return threading.current_thread().ident
+        assert get_num_threads() == 1
+        assert len(set(pmap(worker, range(8)))) == 1
+        assert len(set(pmap(worker, range(8), threads=4))) > 1
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+import scipy.sparse as sp
+from tools import np_equal, np_almost_equal
+from dana import ConnectionError
+from dana import DenseConnection, SparseConnection, SharedConnection
+from dana.delay import History
+
+
+class HistoryTestCase(unittest.TestCase):
+
+    def test_1(self):
+        H = History((3,), 3)
+        for i in range(5):
+            H.record(self, np.ones(3)*i)
+        assert np_equal(H[0], np.ones(3)*4)
+        assert np_equal(H[2], np.ones(3)*2)
+
+    def test_2(self):
+        H = History((3,), 2)
+        for i in range(3):
+            H.record(self, np.ones(3)*i)
+        H.grow(4)
+        assert H.depth == 4
+        assert np_equal(H[1], np.ones(3)*1)
+        assert np_equal(H[3], np.zeros(3))
+
+    def test_3(self):
+        H = History((3,), 3)
+        a, b = object(), object()
+        H.record(a, np.ones(3)*1), H.record(b, np.ones(3)*1)
+        H.record(a, np.ones(3)*2), H.record(b, np.ones(3)*2)
+        assert np_equal(H[1], np.ones(3)*1)
+        assert np_equal(H[0], np.ones(3)*2)
+
+
+class DelayTestCase(unittest.TestCase):
+
+    def run_(self, C, S, T, n=6):
+        states, outputs = [], []
+        for t in range(n):
+            S[...] = np.random.random(S.shape)
+            states.append(S.copy())
+            T[...] = 0
+            C.propagate()
+            outputs.append(T.copy())
+        return states, outputs
+
+    def test_dense(self):
+        S, T = np.zeros(10), np.zeros(5)
+        W = np.random.random((5,10))
+        C = DenseConnection(S, T, W, delays=2)
+        states, outputs = self.run_(C, S, T)
+        assert np_equal(outputs[1], np.zeros(5))
+        for t in range(2,6):
+            assert np_almost_equal(outputs[t], np.dot(W, states[t-2]))
+
+    def test_shared(self):
+        S, T = np.zeros(10), np.zeros(10)
+        K = np.random.random(3)
+        C1 = SharedConnection(S, T, K, delays=1)
+        C2 = SharedConnection(S, T, K)
+        states, outputs = self.run_(C1, S, T)
+        C2._actual_source = states[3]
+        assert np_almost_equal(outputs[4], C2.output())
+
+    def test_synapses(self):
+        S, T = np.zeros(10), np.zeros(5)
+        W = np.random.random((5,10))
+        D = np.random.randint(0,4,(5,10))
+        for C in [DenseConnection(S, T, W, delays=D),
+                  SparseConnection(S, T, sp.csr_matrix(W), delays=D)]:
+            states, outputs = self.run_(C, S, T)
+            R = np.zeros(5)
+            for i in range(5):
+                for j in range(10):
+                    R[i] += W[i,j]*states[5-D[i,j]][j]
+            assert np_almost_equal(outputs[5], R)
+
+    def test_sharing(self):
+        S, T = np.zeros(10), np.zeros(5)
+        W = np.random.random((5,10))
+        C1 = DenseConnection(S, T, W, delays=1)
+        C2 = DenseConnection(S, T, W, delays=3)
+        assert C1._history is C2._history
+        assert C1._history.depth == 4
+        states = []
+        for t in range(5):
+            S[...] = np.random.random(10)
+            states.append(S.copy())
+            T[...] = 0
+            C1.propagate(), C2.propagate()
+        assert np_almost_equal(T, np.dot(W, states[3]) + np.dot(W, states[1]))
+
+    def test_error(self):
+        S, T = np.zeros(10), np.zeros(10)
+        self.assertRaises(ConnectionError, SharedConnection, S, T,
+                          np.ones(3), delays=np.ones((10,10)))
+        self.assertRaises(ConnectionError, DenseConnection, S, T,
+                          np.ones((10,10)), delays=-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,7 +33,7 @@
 import unittest
 from numpy import *
 import scipy.sparse as sp
-from tools import np_equal
+from tools import np_equal, np_almost_equal
 from dana import DenseConnection as Connection
 
 
@@ -216,5 +216,107 @@ class DenseTwoDimensionTestCase(unittest.TestCase):
         assert np_equal(C[2,2],K)
                         
 
+class DenseEventsTestCase(unittest.TestCase):
+
+    def test_1(self):
+        S = (random.random(100) < .02)*1.0
+        W = random.random((50,100))*(random.random((50,100)) < .2)
+        R = Connection(S, ones(50), W, events=False).output()
+        assert np_almost_equal(Connection(S, ones(50), W).output(), R)
+        assert np_almost_equal(Connection(S, ones(50), W, events=True).output(), R)
+
+    def test_2(self):
+        S = zeros(100)
+        W = random.random((50,100))*(random.random((50,100)) < .2)
+        assert np_equal(Connection(S, ones(50), W, events=True).output(), zeros(50))
+
+    def test_3(self):
+        S = random.random(100)
+        W = random.random((50,100))*(random.random((50,100)) < .2)
+        C = Connection(S, ones(50), W)
+        assert C.active_units() is None
+        C = Connection(S, ones(50), W, events=True)
+        assert len(C.active_units()) == 100
+
+
+class DenseCompactTestCase(unittest.TestCase):
+
+    def test_1(self):
+        S = random.random(100)
+        W = random.random((50,100))
+        R = Connection(S, ones(50), W).output()
+        assert abs(Connection(S, ones(50), W, storage='float16').output()-R).max() < 1e-1
+        assert abs(Connection(S, ones(50), W, storage='int8').output()-R).max() < 1e-1
+
+    def test_2(self):
+        S = ones(100)
+        W = random.random((50,100))
+        C = Connection(S, ones(50), W, storage='int8')
+        assert C._storage.nbytes < C.weights.nbytes
+        assert abs(C.weights - W).max() < 1e-2
+
+    def test_3(self):
+        import dana.compact
+        size, dana.compact.block_size = dana.compact.block_size, 256
+        try:
+            S = ones(100)
+            W = random.random((50,100))
+            C1 = Connection(S, ones(50), W, 'dW/dt = 1', storage='float16')
+            C2 = Connection(S, ones(50), W, 'dW/dt = 1')
+            C1.evaluate(dt=.1), C2.evaluate(dt=.1)
+            assert abs(C1.output()-C2.output()).max() < 1e-1
+        finally:
+            dana.compact.block_size = size
+
+    def test_4(self):
+        S, K = ones((20,20)), random.random((3,3))
+        C = Connection(S, S, K, storage='float16')
+        assert C._shared is None
+        assert C._storage is not None
+        R = Connection(S, S, K).output()
+        assert abs(C.output()-R).max() < 1e-2
+
+
+class DenseMappedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile, dana.mapped
+        self.file = tempfile.NamedTemporaryFile()
+        self.size, dana.mapped.block_size = dana.mapped.block_size, 256
+        self.W = random.random((50,100))
+        self.M = memmap(self.file.name, dtype=float, mode='w+', shape=(50,100))
+        self.M[...] = self.W
+
+    def tearDown(self):
+        import dana.mapped
+        dana.mapped.block_size = self.size
+        del self.M
+        self.file.close()
+
+    def test_1(self):
+        S = random.random(100)
+        C = Connection(S, ones(50), self.M)
+        assert C._weights is None
+        assert np_almost_equal(C.output(), Connection(S, ones(50), self.W).output())
+
+    def test_2(self):
+        S = (random.random(100) < .1)*1.0
+        C = Connection(S, ones(50), self.M, events=True)
+        assert np_almost_equal(C.output(), dot(self.W,S))
+
+    def test_3(self):
+        S = ones(100)
+        C = Connection(S, ones(50), self.M, 'dW/dt = 1')
+        C.evaluate(dt=.1)
+        assert np_almost_equal(array(self.M), self.W+.1)
+
+    def test_4(self):
+        self.M[3,5] = NaN
+        C = Connection(ones(100), ones(50), self.M, 'dW/dt = 1')
+        C.evaluate(dt=.1)
+        assert C._mask.nbytes == 50*13
+        assert isnan(C[3][5]) and not isnan(C[3][4])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from dana import SharedConnection, SigmaPiConnection
+from dana import fft_backend
+
+
+class FFTBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = fft_backend.get_backend()
+
+    def tearDown(self):
+        fft_backend.set_backend(self.backend)
+
+    def test_available(self):
+        assert 'numpy' in fft_backend.backends
+        assert fft_backend.get_backend() == fft_backend.backends[0]
+        self.assertRaises(ValueError, fft_backend.set_backend, 'unknown')
+
+    def test_backends(self):
+        Z = np.random.random((12,10))
+        for name in fft_backend.backends:
+            fft_backend.set_backend(name)
+            for i in range(2):
+                F = fft_backend.rfftn(Z, (16,12))
+                assert np.allclose(F, np.fft.rfftn(Z, (16,12)))
+                assert np.allclose(fft_backend.irfftn(F, (16,12)),
+                                   np.fft.irfftn(F, (16,12)))
+            F = fft_backend.rfftn(Z[np.newaxis], axes=(-1,))
+            assert np.allclose(F, np.fft.rfftn(Z[np.newaxis], axes=(-1,)))
+
+    def test_plans_per_thread(self):
+        import threading
+        class module(object):
+            empty_aligned = staticmethod(np.empty)
+        def rfftn(buffer, **kwargs):
+            return object()
+        pyfftw, fft_backend.pyfftw = fft_backend.pyfftw, module
+        try:
+            Z = np.zeros((4,4))
+            plans = []
+            def worker():
+                plans.append(fft_backend._plan(rfftn, Z, None, None))
+                plans.append(fft_backend._plan(rfftn, Z, None, None))
+            threads = [threading.Thread(target=worker) for i in range(2)]
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+        finally:
+            fft_backend.pyfftw = pyfftw
+        assert plans[0] is plans[1] and plans[2] is plans[3]
+        assert plans[0] is not plans[2]
+
+    def test_threaded_blocks(self):
+        from dana import set_num_threads
+        Z = np.random.random((200,150))
+        K = np.random.random((5,5))
+        for name in fft_backend.backends:
+            fft_backend.set_backend(name)
+            C = SharedConnection(Z, Z, K, blocks=32)
+            assert C._blocks is not None
+            R = C.output()
+            set_num_threads(4)
+            try:
+                for i in range(3):
+                    assert np.abs(C.output() - R).max() < 1e-10
+            finally:
+                set_num_threads(1)
+
+    def test_connections(self):
+        Z = np.random.random((30,30))
+        K = np.random.random((5,5))
+        M = np.random.random((30,30))
+        R = [SharedConnection(Z, Z, K).output(),
+             SharedConnection(Z, Z, K, True).output(),
+             SigmaPiConnection(Z, M, Z).output()]
+        for name in fft_backend.backends:
+            fft_backend.set_backend(name)
+            for C, R_ in zip([SharedConnection(Z, Z, K),
+                              SharedConnection(Z, Z, K, True),
+                              SigmaPiConnection(Z, M, Z)], R):
+                assert abs(C.output()-R_).max() < 1e-10
+
+
+if __name__ == "__main__":
+    unittest.main()
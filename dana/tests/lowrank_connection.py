@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from tools import np_equal, np_almost_equal
+from dana import ConnectionError
+from dana import DenseConnection, LowRankConnection
+
+
+class LowRankTestCase(unittest.TestCase):
+
+    def test_1(self):
+        Z = np.random.random((4,5))
+        W = np.random.random((20,20))
+        C = LowRankConnection(Z, Z, W)
+        assert np_almost_equal(C.output(), DenseConnection(Z, Z, W).output())
+        assert C.error < 1e-10
+
+    def test_2(self):
+        Z = np.random.random((4,5))
+        u, v = np.random.random((20,2)), np.random.random((2,20))
+        C = LowRankConnection(Z, Z, np.dot(u,v), rank=2)
+        assert C.rank == 2
+        assert C.factors[0].shape == (20,2)
+        assert np_almost_equal(C.output(), np.dot(np.dot(u,v), Z.ravel()).reshape(Z.shape))
+        assert C.error < 1e-6
+
+    def test_3(self):
+        Z = np.random.random((20,20))
+        K = np.random.random((3,3))
+        C = LowRankConnection(Z, Z, K, rank=10)
+        W = DenseConnection(Z, Z, K).weights
+        E = np.sqrt(((W-C.weights)**2).sum()/(W**2).sum())
+        assert C.rank == 10
+        assert abs(E-C.error) < 1e-6
+
+    def test_4(self):
+        Z = np.ones(3)
+        u, v = np.ones((3,1)), np.ones((1,3))
+        C = LowRankConnection(Z, Z, (u,v))
+        assert np_equal(C.output(), 3*np.ones(3))
+        assert np_equal(C[1], np.ones(3))
+
+    def test_5(self):
+        Z = np.ones(3)
+        self.assertRaises(ConnectionError, LowRankConnection,
+                          Z, Z, (np.ones((2,1)), np.ones((1,3))))
+
+    def test_6(self):
+        Z = np.ones(3)
+        C = LowRankConnection(Z, Z, np.ones((3,3)), equation='dW/dt = 1')
+        C.evaluate(dt=.1)
+        assert np_almost_equal(C.weights, 1.1*np.ones((3,3)))
+        assert C.rank == 1
+
+    def test_7(self):
+        Z = np.ones(4)
+        u, v = np.random.random((4,2)), np.random.random((2,4))
+        C = LowRankConnection(Z, Z, (u,v), equation='dW/dt = 1')
+        C.evaluate(dt=.1)
+        assert C.rank == 2
+        assert C.factors[0].shape == (4,2)
+
+    def test_8(self):
+        Z = np.ones(5)
+        K = np.ones(3)
+        C = LowRankConnection(Z, Z, K)
+        D = DenseConnection(Z, Z, K)
+        assert np_almost_equal(C[0], D[0])
+        assert np.isnan(C[0][3])
+
+    def test_9(self):
+        Z = np.ones((20,30))
+        W = np.random.random((600,600))
+        W[3,5] = np.NaN
+        C = LowRankConnection(Z, Z, W, rank=4)
+        assert C._mask.nnz == 1
+        assert np.isnan(C[0,3][0,5])
+        assert np.isnan(C[0,3]).sum() == 1
+        C = LowRankConnection(Z, Z, np.random.random((600,600)), rank=4)
+        assert C._mask is None
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from scipy.ndimage.filters import maximum_filter, uniform_filter
+from dana import zeros, ConnectionError, PoolingConnection
+
+
+class PoolingTestCase(unittest.TestCase):
+
+    def test_stride(self):
+        S = np.random.random((8,6))
+        B = S.reshape((4,2,3,2))
+        C = PoolingConnection(S, np.zeros((4,3)), 2, 2, 'max')
+        assert np.allclose(C.output(), B.max(axis=(1,3)))
+        C = PoolingConnection(S, np.zeros((4,3)), 2, 2, 'mean')
+        assert np.allclose(C.output(), B.mean(axis=(1,3)))
+        C = PoolingConnection(S, np.zeros((4,3)), 2, 2, 'l2')
+        assert np.allclose(C.output(), np.sqrt((B**2).sum(axis=(1,3))))
+
+    def test_max(self):
+        S = np.random.random((10,12))
+        C = PoolingConnection(S, np.zeros((10,12)), (3,5), op='max')
+        assert np.allclose(C.output(), maximum_filter(S, (3,5), mode='constant',
+                                                      cval=-np.inf))
+
+    def test_max_toric(self):
+        S = np.random.random((10,12))
+        C = PoolingConnection(S, np.zeros((10,12)), 3, op='max', toric=True)
+        assert np.allclose(C.output(), maximum_filter(S, 3, mode='wrap'))
+
+    def test_mean(self):
+        S = np.random.random((10,12))
+        C = PoolingConnection(S, np.zeros((10,12)), 3, op='mean', toric=True)
+        assert np.allclose(C.output(), uniform_filter(S, 3, mode='wrap'))
+        C = PoolingConnection(S, np.zeros((10,12)), 3, op='mean')
+        assert np.allclose(C.output()[1:-1,1:-1], uniform_filter(S, 3)[1:-1,1:-1])
+        assert np.allclose(C.output()[0,0], S[:2,:2].mean())
+
+    def test_resampling(self):
+        S = np.random.random((10,10))
+        C = PoolingConnection(S, np.zeros((4,4)), 3, op='max')
+        i = np.rint(np.linspace(0,9,4)).astype(int)
+        R = maximum_filter(S, 3, mode='constant', cval=-np.inf)
+        assert np.allclose(C.output(), R[np.ix_(i,i)])
+
+    def test_1d(self):
+        S = np.random.random(12)
+        C = PoolingConnection(S, np.zeros(4), 3, 3, 'max')
+        assert np.allclose(C.output(), S.reshape((4,3)).max(axis=1))
+
+    def test_group(self):
+        S = zeros((8,8), 'V')
+        T = zeros((4,4), 'V')
+        S.V = np.random.random((8,8))
+        C = PoolingConnection(S('V'), T('V'), 2, 2, 'max')
+        C.propagate()
+        assert np.allclose(T.V, S.V.reshape((4,2,4,2)).max(axis=(1,3)))
+
+    def test_error(self):
+        self.assertRaises(ConnectionError, PoolingConnection, np.ones((4,4)),
+                          np.ones((2,2)), 2, 2, 'min')
+        self.assertRaises(ConnectionError, PoolingConnection, np.ones((4,4)),
+                          np.ones((2,2)), (2,2,2), 2, 'max')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from dana import zeros, ConnectionError, ReductionConnection, DenseConnection
+
+
+class ReductionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.S = np.random.random((10,10))-.5
+        self.T = np.zeros((5,5))
+
+    def check(self, op, value):
+        C = ReductionConnection(self.S, self.T, op, scale=2.0)
+        assert np.allclose(C.output(), np.ones((5,5))*2*value)
+
+    def test_sum(self):
+        self.check('sum', self.S.sum())
+
+    def test_max(self):
+        self.check('max', self.S.max())
+
+    def test_l1(self):
+        self.check('l1', np.abs(self.S).sum())
+
+    def test_l2(self):
+        self.check('l2', np.sqrt((self.S**2).sum()))
+
+    def test_softmax(self):
+        self.check('softmax', np.exp(self.S).sum())
+
+    def test_argmax(self):
+        T = np.zeros((10,10))
+        C = ReductionConnection(self.S, T, 'argmax')
+        R = np.zeros((10,10))
+        R[np.unravel_index(np.argmax(self.S), (10,10))] = 1
+        assert np.allclose(C.output(), R)
+
+    def test_dense(self):
+        S, T = np.random.random(20), np.zeros(10)
+        R = DenseConnection(S, T, -0.1*np.ones((10,20))).output()
+        assert np.allclose(ReductionConnection(S, T, 'sum', -0.1).output(), R)
+
+    def test_group(self):
+        S = zeros((10,), 'V')
+        T = zeros((10,), 'V')
+        S.V = np.random.random(10)
+        ReductionConnection(S('V'), T('V'), 'max')
+        T.propagate()
+        assert np.allclose(T.V, S.V.max())
+
+    def test_error(self):
+        self.assertRaises(ConnectionError, ReductionConnection, self.S,
+                          self.T, 'min')
+        self.assertRaises(ConnectionError, ReductionConnection, self.S,
+                          self.T, 'argmax')
+
+
+if __name__ == "__main__":
+    unittest.main()
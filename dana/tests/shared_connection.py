@@ -34,7 +34,8 @@
 import unittest
 from numpy import *
 import scipy.sparse as sp
-from tools import np_equal
+from tools import np_equal, np_almost_equal
+from scipy.ndimage.filters import convolve
 from dana import ConnectionError
 from dana import SharedConnection as Connection
 
@@ -223,5 +224,40 @@ class SharedTwoDimensionTestCase(unittest.TestCase):
         C = Connection(Z,Z,K,fft=False)
         assert np_equal(C[2,2],K)
 
+class SharedThreeDimensionTestCase(unittest.TestCase):
+
+    def test_1(self):
+        assert np_equal( Connection(ones((3,3,3)), ones((3,3,3)), ones((1,1,1)),fft=False).output(),
+                         ones((3,3,3)))
+
+    def test_2(self):
+        assert np_equal( Connection(ones((5,5,5)), ones((3,3,3)), ones((1,1,1)),fft=False).output(),
+                         ones((3,3,3)))
+
+    def test_3(self):
+        Z = random.random((4,5,6))
+        K = random.random((3,3,3))
+        R = convolve(Z, K[::-1,::-1,::-1], mode='constant')
+        assert np_almost_equal( Connection(Z, Z, K, fft=False).output(), R)
+
+    def test_4(self):
+        Z = random.random((4,5,6))
+        K = random.random((3,2,3))
+        R = convolve(Z, K[::-1,::-1,::-1], mode='wrap')
+        assert np_almost_equal( Connection(Z, Z, K, toric=True, fft=False).output(), R)
+
+    def test_5(self):
+        Z = random.random((5,5,5))
+        K = random.random((3,3,3))
+        R = convolve(Z, K[::-1,::-1,::-1], mode='constant')[::2,::2,::2]
+        assert np_almost_equal( Connection(Z, ones((3,3,3)), K, fft=False).output(), R)
+
+    def test_6(self):
+        C = Connection(ones((3,3,3)), ones((3,3,3)), ones((1,1,1)),fft=False)
+        R = ones((3,3,3))*NaN
+        R[1,2,0] = 1
+        assert np_equal(C[1,2,0], R)
+
+
 if __name__ == "__main__":
     unittest.main()
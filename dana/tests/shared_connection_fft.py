@@ -34,9 +34,11 @@
 import unittest
 from numpy import *
 import scipy.sparse as sp
-from tools import np_equal
+from tools import np_equal, np_almost_equal
+from scipy.ndimage.filters import convolve
 from dana import ConnectionError
 from dana import SharedConnection as Connection
+from dana import set_num_threads
 
 class SharedFFTOneDimensionTestCase(unittest.TestCase):
 
@@ -223,5 +225,165 @@ class SharedFFTTwoDimensionTestCase(unittest.TestCase):
         C = Connection(Z,Z,K,fft=True)
         assert np_equal(C[2,2],K)
 
+class SharedFFTThreeDimensionTestCase(unittest.TestCase):
+
+    def test_1(self):
+        assert np_equal( Connection(ones((3,3,3)), ones((3,3,3)), ones((1,1,1)),fft=True).output(),
+                         ones((3,3,3)))
+
+    def test_2(self):
+        assert np_equal( Connection(ones((5,5,5)), ones((3,3,3)), ones((1,1,1)),fft=True).output(),
+                         ones((3,3,3)))
+
+    def test_3(self):
+        Z = random.random((4,5,6))
+        K = random.random((3,3,3))
+        R = convolve(Z, K[::-1,::-1,::-1], mode='constant')
+        assert np_almost_equal( Connection(Z, Z, K, fft=True).output(), R)
+
+    def test_4(self):
+        Z = random.random((4,5,6))
+        K = random.random((3,2,3))
+        R = convolve(Z, K[::-1,::-1,::-1], mode='wrap')
+        assert np_almost_equal( Connection(Z, Z, K, toric=True, fft=True).output(), R)
+
+    def test_5(self):
+        Z = random.random((5,5,5))
+        K = random.random((3,3,3))
+        R = convolve(Z, K[::-1,::-1,::-1], mode='constant')[::2,::2,::2]
+        assert np_almost_equal( Connection(Z, ones((3,3,3)), K, fft=True).output(), R)
+
+    def test_6(self):
+        C = Connection(ones((3,3,3)), ones((3,3,3)), ones((1,1,1)),fft=True)
+        R = ones((3,3,3))*NaN
+        R[1,2,0] = 1
+        assert np_equal(C[1,2,0], R)
+
+
+class SharedFFTDecimationTestCase(unittest.TestCase):
+
+    def check(self, src, dst, kernel, toric=False):
+        Z = random.random(src)
+        K = random.random(kernel)
+        K[(0,)*len(kernel)] = NaN
+        C = Connection(Z, ones(dst), K, toric=toric, fft=True)
+        assert C._decimation is not None
+        R = C.output()
+        C._decimation = None
+        assert abs(R - C.output()).max() < 1e-10
+
+    def test_1(self):
+        self.check((100,), (10,), (5,))
+
+    def test_2(self):
+        self.check((100,), (10,), (6,), toric=True)
+
+    def test_3(self):
+        self.check((64,64), (9,7), (4,4))
+
+    def test_4(self):
+        self.check((64,64), (8,8), (4,3), toric=True)
+
+    def test_5(self):
+        self.check((20,20,20), (5,5,5), (3,3,3))
+
+
+class SharedFFTBlocksTestCase(unittest.TestCase):
+
+    def check(self, src, kernel, size):
+        Z = random.random(src)
+        K = random.random(kernel)
+        C = Connection(Z, Z, K, fft=True, blocks=size)
+        assert C._blocks is not None
+        R = convolve(Z, K[(slice(None,None,-1),)*len(kernel)], mode='constant')
+        assert abs(C.output() - R).max() < 1e-10
+
+    def test_1(self):
+        self.check((1000,), (9,), 64)
+
+    def test_2(self):
+        self.check((100,70), (5,4), 32)
+
+    def test_3(self):
+        self.check((40,30,20), (3,3,3), 16)
+
+    def test_4(self):
+        set_num_threads(2)
+        try:
+            self.check((100,70), (5,5), 32)
+        finally:
+            set_num_threads(1)
+
+    def test_5(self):
+        Z = random.random((200,100))
+        K = random.random((5,5))
+        random.seed(1)
+        C = Connection(Z, Z, K, fft=True, blocks=False)
+        assert C._blocks is None
+        C = Connection(Z, Z, K, fft=True)
+        state = random.random()
+        random.seed(1)
+        assert state == random.random()
+
+
+class SharedFFTBatchTestCase(unittest.TestCase):
+
+    def test_1(self):
+        from dana.shared_connection import batch_fft
+        A, B = random.random((30,30)), random.random((30,30))
+        T = zeros((30,30))
+        C = [Connection(A, T, random.random((5,5))),
+             Connection(A, T, random.random((5,5))),
+             Connection(B, T, random.random((3,3))),
+             Connection(B, T, random.random((5,5)), toric=True),
+             Connection(A, T, random.random((5,5)), toric=True)]
+        R = [c.output() for c in C]
+        batch_fft(C)
+        assert C[0]._batched is not None and C[3]._batched is not None
+        for c, r in zip(C, R):
+            assert abs(c.output()-r).max() < 1e-10
+            assert c._batched is None
+
+    def test_2(self):
+        from dana import zeros as zeros_, Network, Clock, DenseConnection
+        net = Network(Clock(0.0, 1.0, 1.0))
+        G = zeros_((40,40), 'dV/dt = I; I')
+        H = zeros_((40,40), 'dV/dt = I; I')
+        net.append(G), net.append(H)
+        G.V = random.random((40,40))
+        H.V = random.random((40,40))
+        K1, K2 = random.random((7,7)), random.random((7,7))
+        Connection(G('V'), H('I'), K1)
+        Connection(H('V'), H('I'), K2)
+        D = DenseConnection(G('V'), G('I'), K1)
+        assert D._shared is not None
+        I_H = Connection(G.V.copy(), zeros((40,40)), K1).output() + \
+              Connection(H.V.copy(), zeros((40,40)), K2).output()
+        I_G = Connection(G.V.copy(), zeros((40,40)), K1).output()
+        net.evaluate(0)
+        assert abs(H.I - I_H).max() < 1e-10
+        assert abs(G.I - I_G).max() < 1e-10
+
+    def test_3(self):
+        from dana import zeros as zeros_, Network, Clock
+        net = Network(Clock(0.0, 1.0, 1.0))
+        X = zeros_((30,30), 'V')
+        A = zeros_((30,30), 'I')
+        B = zeros_((30,30), 'J; L')
+        net.append(X), net.append(A), net.append(B)
+        X.V = random.random((30,30))
+        K1, K2, K3 = [random.random((5,5)) for i in range(3)]
+        Connection(X('V'), A('I'), K1)
+        Connection(A('I'), B('J'), K2)
+        Connection(A('I'), B('L'), K3)
+        I = Connection(X.V.copy(), zeros((30,30)), K1).output()
+        J = Connection(I.copy(), zeros((30,30)), K2).output()
+        L = Connection(I.copy(), zeros((30,30)), K3).output()
+        net.evaluate(0)
+        assert abs(A.I - I).max() < 1e-10
+        assert abs(B.J - J).max() < 1e-10
+        assert abs(B.L - L).max() < 1e-10
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from scipy.ndimage.filters import convolve
+from dana import zeros, ConnectionError, SigmaPiConnection
+
+
+class SigmaPiTestCase(unittest.TestCase):
+
+    def check(self, shape, modulator, toric=False):
+        S = np.random.random(shape)
+        M = np.random.random(modulator)
+        C = SigmaPiConnection(S, M, np.zeros(shape), scale=0.5, toric=toric)
+        mode = toric and 'wrap' or 'constant'
+        assert abs(C.output() - 0.5*convolve(S,M,mode=mode)).max() < 1e-10
+        M[...] = np.random.random(modulator)
+        assert abs(C.output() - 0.5*convolve(S,M,mode=mode)).max() < 1e-10
+        S[...] = np.random.random(shape)
+        assert abs(C.output() - 0.5*convolve(S,M,mode=mode)).max() < 1e-10
+
+    def test_1d(self):
+        self.check((50,), (50,))
+
+    def test_1d_toric(self):
+        self.check((50,), (50,), True)
+
+    def test_2d(self):
+        self.check((20,30), (20,30))
+
+    def test_2d_small(self):
+        self.check((20,30), (5,4))
+
+    def test_2d_toric(self):
+        self.check((20,30), (7,4), True)
+
+    def test_3d(self):
+        self.check((8,9,10), (3,4,5))
+
+    def test_cache(self):
+        S, M = np.random.random((20,20)), np.random.random((20,20))
+        C = SigmaPiConnection(S, M, np.zeros((20,20)))
+        C.output()
+        spectrum = C._spectra['source'][1]
+        M[...] = np.random.random((20,20))
+        C.output()
+        assert C._spectra['source'][1] is spectrum
+
+    def test_group(self):
+        S = zeros((10,10), 'V')
+        M = zeros((10,10), 'V')
+        T = zeros((10,10), 'V')
+        S.V, M.V = np.random.random((2,10,10))
+        C = SigmaPiConnection(S('V'), M('V'), T('V'))
+        C.propagate()
+        assert abs(T.V - convolve(S.V,M.V,mode='constant')).max() < 1e-10
+
+    def test_resampling(self):
+        S, M = np.random.random((20,20)), np.random.random((20,20))
+        C = SigmaPiConnection(S, M, np.zeros((10,10)))
+        R = convolve(S,M,mode='constant')
+        i = np.rint(np.linspace(0,19,10)).astype(int)
+        assert abs(C.output() - R[np.ix_(i,i)]).max() < 1e-10
+
+    def test_error(self):
+        self.assertRaises(ConnectionError, SigmaPiConnection, np.ones((5,5)),
+                          np.ones((7,7)), np.ones((5,5)), 1.0, True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,7 +34,7 @@
 import unittest
 from numpy import *
 import scipy.sparse as sp
-from tools import np_equal
+from tools import np_equal, np_almost_equal
 from dana import SparseConnection as Connection
 
 
@@ -226,5 +226,134 @@ class SparseTwoDimensionTestCase(unittest.TestCase):
         C = Connection(Z,Z,K)
         assert np_equal(C[2,2],K)
 
+class SparseEventsTestCase(unittest.TestCase):
+
+    def test_1(self):
+        S = (random.random(100) < .02)*1.0
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        R = Connection(S, ones(50), W, events=False).output()
+        assert np_almost_equal(Connection(S, ones(50), W).output(), R)
+        assert np_almost_equal(Connection(S, ones(50), W, events=True).output(), R)
+
+    def test_2(self):
+        S = zeros(100)
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        assert np_equal(Connection(S, ones(50), W, events=True).output(), zeros(50))
+
+    def test_3(self):
+        S = random.random(100)
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        C = Connection(S, ones(50), W)
+        assert C.active_units() is None
+        C = Connection(S, ones(50), W, events=True)
+        assert len(C.active_units()) == 100
+
+    def test_4(self):
+        S = (random.random(100) < .02)*1.0
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        C1 = Connection(S, ones(50), W, 'dW/dt = 1', events=True)
+        C2 = Connection(S, ones(50), W, 'dW/dt = 1', events=False)
+        C1.output()
+        C1.evaluate(dt=.1), C2.evaluate(dt=.1)
+        assert np_almost_equal(C1.output(), C2.output())
+
+
+class SparseCompactTestCase(unittest.TestCase):
+
+    def test_1(self):
+        S = random.random(100)
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        R = Connection(S, ones(50), W).output()
+        assert abs(Connection(S, ones(50), W, storage='float16').output()-R).max() < 1e-1
+        assert abs(Connection(S, ones(50), W, storage='int8').output()-R).max() < 1e-1
+
+    def test_2(self):
+        S = ones(100)
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        C = Connection(S, ones(50), W, storage='int8')
+        assert C._storage.nbytes < C.weights.data.nbytes
+        assert abs(C.weights.toarray() - W.toarray()).max() < 1e-2
+
+    def test_3(self):
+        import dana.compact
+        size, dana.compact.block_size = dana.compact.block_size, 256
+        try:
+            S = ones(100)
+            W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+            C1 = Connection(S, ones(50), W, 'dW/dt = 1', storage='float16')
+            C2 = Connection(S, ones(50), W, 'dW/dt = 1')
+            C1.evaluate(dt=.1), C2.evaluate(dt=.1)
+            assert abs(C1.output()-C2.output()).max() < 1e-1
+        finally:
+            dana.compact.block_size = size
+
+    def test_4(self):
+        S, K = ones((20,20)), random.random((3,3))
+        C = Connection(S, S, K, storage='float16')
+        assert C._shared is None
+        assert C._storage is not None
+        R = Connection(S, S, K).output()
+        assert abs(C.output()-R).max() < 1e-2
+
+    def test_5(self):
+        S = ones(100)
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        C = Connection(S, ones(50), W, storage='float16')
+        D = Connection(S, ones(50), W)
+        assert np_almost_equal(C[3], D[3], 1e-1)
+
+    def test_6(self):
+        import dana.compact
+        size, dana.compact.block_size = dana.compact.block_size, 256
+        S, T = random.random(100), random.random(50)
+        W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        C1 = Connection(S, T, W, 'dW/dt = pre*post', storage='float16')
+        C2 = Connection(S, T, W, 'dW/dt = pre*post')
+        toarray = C1._storage.toarray
+        def fail():
+            raise AssertionError
+        C1._storage.toarray = fail
+        try:
+            C1.evaluate(dt=.1), C2.evaluate(dt=.1)
+        finally:
+            dana.compact.block_size = size
+            C1._storage.toarray = toarray
+        assert abs(C1.weights.toarray()-C2.weights.toarray()).max() < 1e-2
+
+
+class SparseLearningTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.S = random.random(100)
+        self.T = random.random(50)
+        self.W = sp.csr_matrix(random.random((50,100))*(random.random((50,100)) < .2))
+        self.D = self.W.toarray()
+        self.mask = self.D != 0
+
+    def test_1(self):
+        C = Connection(self.S, self.T, self.W, 'dW/dt = pre*post')
+        C.evaluate(dt=.1)
+        R = where(self.mask, self.D + .1*outer(self.T,self.S), 0)
+        assert np_almost_equal(C.weights.toarray(), R)
+        assert C.weights.nnz == self.W.nnz
+
+    def test_2(self):
+        C = Connection(self.S, self.T, self.W, 'dW/dt = post*(pre-W)')
+        C.evaluate(dt=.1)
+        R = where(self.mask, self.D + .1*self.T.reshape((50,1))*(self.S-self.D), 0)
+        assert np_almost_equal(C.weights.toarray(), R)
+
+    def test_3(self):
+        from dana import zeros as zeros_
+        src = zeros_((100,), 'V; U')
+        tgt = zeros_((50,), 'V')
+        src.U = self.S
+        tgt.V = self.T
+        C = Connection(src('V'), tgt('V'), self.W, 'dW/dt = pre.U*post.V - 1')
+        C.evaluate(dt=.1)
+        R = where(self.mask, self.D + .1*(outer(self.T,self.S)-1), 0)
+        assert np_almost_equal(C.weights.toarray(), R)
+
+
 if __name__ == "__main__":
     unittest.main()
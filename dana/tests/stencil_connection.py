@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+import unittest
+import numpy as np
+from tools import np_equal, np_almost_equal
+from scipy.ndimage.filters import convolve
+from dana import zeros, ConnectionError
+from dana import DenseConnection, SparseConnection, SharedConnection
+from dana import StencilConnection
+
+
+class StencilTestCase(unittest.TestCase):
+
+    def check(self, shape, kernel, toric=False):
+        Z = np.random.random(shape)
+        K = np.random.random(kernel)
+        K[(0,)*len(kernel)] = np.NaN
+        C = StencilConnection(Z, Z, K, toric=toric)
+        R = SharedConnection(Z, Z, K, toric=toric, fft=False).output()
+        assert np_almost_equal(C.output(), R)
+
+    def test_1(self):
+        self.check((10,), (3,))
+
+    def test_2(self):
+        self.check((10,), (4,), toric=True)
+
+    def test_3(self):
+        self.check((10,8), (3,3))
+
+    def test_4(self):
+        self.check((10,8), (4,5), toric=True)
+
+    def test_5(self):
+        self.check((3,3), (7,7), toric=True)
+
+    def test_6(self):
+        self.check((6,5,4), (3,2,3))
+
+    def test_7(self):
+        Z = zeros((5,5), 'V=N; N')
+        Z.V[2,2] = 1
+        K = np.array([[1,1,1],[1,np.NaN,1],[1,1,1]])
+        C = StencilConnection(Z('V'), Z('N'), K)
+        C.propagate()
+        R = np.zeros((5,5))
+        R[1:4,1:4] = 1
+        R[2,2] = 0
+        assert np_equal(Z.N, R)
+
+    def test_8(self):
+        C = StencilConnection(np.ones((3,3)), np.ones((3,3)), np.ones((3,3)))
+        assert np_equal(C[0,0], np.array([[1,1,np.NaN],
+                                          [1,1,np.NaN],
+                                          [np.NaN,np.NaN,np.NaN]]))
+
+    def test_9(self):
+        Z = np.ones((5,5))
+        self.assertRaises(ConnectionError, StencilConnection,
+                          Z, np.ones((3,3)), np.ones((3,3)))
+        self.assertRaises(ConnectionError, StencilConnection,
+                          Z, Z, np.ones((9,9)))
+
+    def test_10(self):
+        Z = np.random.random((256,256))
+        K = np.array([[1,1,1],[1,np.NaN,1],[1,1,1]])
+        C = SparseConnection(Z, Z, K)
+        assert isinstance(C._shared, StencilConnection)
+        R = convolve(Z, np.nan_to_num(K), mode='constant')
+        assert np.abs(C.output()-R).max() < 1e-10
+
+    def test_11(self):
+        Z = np.random.random(2)
+        K = np.random.random(7)
+        C = StencilConnection(Z, np.ones(2), K)
+        assert np_almost_equal(C.output(), DenseConnection(Z, np.ones(2), K).output())
+
+
+if __name__ == "__main__":
+    unittest.main()
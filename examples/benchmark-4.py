@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright INRIA
+# Contributors: Nicolas P. Rougier (Nicolas.Rougier@inria.fr)
+#
+# DANA is a computing framework for the simulation of distributed,
+# asynchronous, numerical and adaptive models.
+#
+# This software is governed by the CeCILL license under French law and abiding
+# by the rules of distribution of free software. You can use, modify and/ or
+# redistribute the software under the terms of the CeCILL license as circulated
+# by CEA, CNRS and INRIA at the following URL
+# http://www.cecill.info/index.en.html.
+#
+# As a counterpart to the access to the source code and rights to copy, modify
+# and redistribute granted by the license, users are provided only with a
+# limited warranty and the software's author, the holder of the economic
+# rights, and the successive licensors have only limited liability.
+#
+# In this respect, the user's attention is drawn to the risks associated with
+# loading, using, modifying and/or developing or reproducing the software by
+# the user in light of its specific status of free software, that may mean that
+# it is complicated to manipulate, and that also therefore means that it is
+# reserved for developers and experienced professionals having in-depth
+# computer knowledge. Users are therefore encouraged to load and test the
+# software's suitability as regards their requirements in conditions enabling
+# the security of their systems and/or data to be ensured and, more generally,
+# to use and operate it in the same conditions as regards security.
+#
+# The fact that you are presently reading this means that you have had
+# knowledge of the CeCILL license and that you accept its terms.
+# -----------------------------------------------------------------------------
+'''
+This script benchmarks reduced precision storage of weights (memory, speed and
+error relative to full precision)
+'''
+import time
+from dana import *
+import scipy.sparse as sps
+
+
+def test(W, n):
+    src, tgt = np.random.random(W.shape[1]), np.ones(W.shape[0])
+    C = type(W) is np.ndarray and DenseConnection or SparseConnection
+    R = None
+    for storage in [None, 'float16', 'int8']:
+        K = C(src, tgt, W, storage=storage)
+        if storage is None:
+            nbytes = W.nbytes if type(W) is np.ndarray else \
+                W.data.nbytes + W.indices.nbytes + W.indptr.nbytes
+        else:
+            nbytes = K._storage.nbytes
+        t0 = time.clock()
+        for i in range(n):
+            Z = K.output()
+        t = time.clock()-t0
+        if R is None:
+            R = Z
+        print '    %-8s: %8d bytes, %.3fs, error = %g' % (
+            storage, nbytes, t, abs(Z-R).max()/abs(R).max())
+    print
+
+for n in [250, 500, 1000]:
+    print 'Dense %dx%d' % (n,n)
+    test(np.random.random((n,n)), 100)
+for n in [1000, 2500, 5000]:
+    print 'Sparse %dx%d (5%%)' % (n,n)
+    test(sps.rand(n,n,0.05,format='csr'), 100)
@@ -86,7 +86,7 @@ def update(G=None, x=-1, y=-1):
                 for axis,group,data,cb,subplot in mgr.subplots:
                     if C._actual_source is data:
                         try:
-                            V = C[y,x]
+                            V = C.receptive_fields([(y,x)])[0]
                             v = max(abs(V[~np.isnan(V)].min()),
                                     abs(V[~np.isnan(V)].max()))
                             axis.set_data(V)
@@ -99,7 +99,7 @@ def update(G=None, x=-1, y=-1):
                             cb.update_normal(axis)
                             for label in cb.ax.get_xticklabels():
                                 label.set_fontsize('x-small')
-                        except NotImplementedError:
+                        except (NotImplementedError, ConnectionError):
                             pass
 
 def button_press_event(event):
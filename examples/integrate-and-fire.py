@@ -64,8 +64,8 @@ n = 40
 src = Group((n,), '''dV/dt = -(V-El)/tau + I*psp/dt : float
                       S    = V > Vt                 : float
                       I                             : float''')
-W = rnd.uniform(0,1,(n,n)) * (rnd.random((n,n)) < sparseness)
-C = DenseConnection(src('S'), src('I'), W)
+W = fixed_probability(src, src, sparseness, lambda n: rnd.uniform(0,1,n))
+C = SparseConnection(src('S'), src('I'), W)
 src.V = Vr + (Vt-Vr)*np.random.random(src.shape)
 
 # Simulation
@@ -36,27 +36,6 @@ SigmaPiConnection
 '''
 from dana import *
 
-class SigmaPiConnection(Connection):
-    def __init__(self, source=None, modulator=None, target=None, scale=1.0):
-        Connection.__init__(self, source, target)
-        self._scale = scale
-        # Get actual modulator
-        names = modulator.dtype.names
-        if names == None:
-            self._actual_modulator = modulator
-        else:
-            self._actual_modulator = (modulator[names[0]])
-    def output(self):
-        src = self._actual_source
-        mod = self._actual_modulator
-        tgt = self._actual_target
-        if len(tgt.shape) == len(src.shape) == len(mod.shape) == 1:
-            return convolve1d(src,mod[::1])*self._scale
-        elif len(tgt.shape) == len(src.shape) == len(mod.shape) == 2:
-            return convolve2d(src,mod[::-1,::-1])*self._scale
-        else:
-            raise NotImplemented
-
 # 1 dimension
 # -----------
 n = 100
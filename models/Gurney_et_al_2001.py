@@ -194,11 +194,11 @@ SparseConnection( PFC('V'), STN('PFC_'), PFC_STN * np.ones(1) )
 SparseConnection( GPe('V'), STN('GPe_'), GPe_STN * np.ones(1) )
 
 # GPe connections
-DenseConnection(  STN('V'), GPe('STN_'), STN_GPe * np.ones((n,n)) )
+ReductionConnection( STN('V'), GPe('STN_'), 'sum', STN_GPe )
 SparseConnection( St2('V'), GPe('St2_'), St2_GPe * np.ones(1)     )
 
 # GPi connections
-DenseConnection(  STN('V'), GPi('STN_'), STN_GPi * np.ones((n,n)) )
+ReductionConnection( STN('V'), GPi('STN_'), 'sum', STN_GPi )
 SparseConnection( St1('V'), GPi('St1_'), St1_GPi * np.ones(1)     ) 
 SparseConnection( GPe('V'), GPi('GPe_'), GPe_GPi * np.ones(1)     ) 
 
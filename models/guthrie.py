@@ -65,7 +65,7 @@ def button_press_event(event):
         for connection in group._connections:
             for ax in axes.values():
                 if connection._source is ax.group.base:
-                     V = connection[y,x]
+                     V = connection.receptive_fields([(y,x)])[0]
                      ax.im.set_data(V)
     else:
         for axis in axes.values():